@@ -1,14 +1,39 @@
-import torch.multiprocessing as mp
-from sklearn.model_selection import RandomizedSearchCV
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
-import pandas as pd
+from __future__ import annotations
 import numpy as np
 import os
-import torch
-import cv2
 import pickle
+import threading
+import json
+import uuid
+import re
+import warnings
+import time
+import struct
+import hashlib
+import importlib.util
+import ctypes
+from collections import Counter, deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import math
+import shutil
+import itertools
+import functools
+
+class _lazy_module:
+    # Las dependencias pesadas (pandas, OpenCV) se importan recién en el primer uso. Al importarse, el módulo
+    # reemplaza a este marcador en QoL, así que los accesos siguientes no pagan nada extra.
+    # sklearn, torch, skimage y mediapipe se importan dentro de las funciones que los usan.
+    def __init__(self, name: str, alias: str):
+        self.__name = name
+        self.__alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name)
+        globals()[self.__alias] = module
+        return getattr(module, attr)
+
+pd = _lazy_module('pandas', 'pd')
+cv2 = _lazy_module('cv2', 'cv2')
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 os.environ["GLOG_minloglevel"] ="2"
@@ -18,8 +43,11 @@ venv = os.path.dirname((os.path.abspath(__file__)))
 # --------------
 # Funciones generales
 
+# Clase extractora de cada técnica de representación
+EXTRACTORS = {'graph': 'mediapipe_landmarks', 'gradient': 'hog_transform'}
+
 def create_files(type: str):    
-    equiv = {'graph':'mediapipe_landmarks','gradient':'hog_transform'}
+    equiv = EXTRACTORS
     
     if type not in list(equiv.keys()):
         raise ValueError('Palabra clave no identificada.')
@@ -69,7 +97,12 @@ def dataset_exists():
 
 def load_model(keywords: dict):
     # keywords = {'tecnica': (graph,gradient,neural), 'modelo':(knn,rf,rn)}
-    path = venv + f'{keywords["tecnica"]}-processing/{keywords["modelo"]}-model.pkl'
+    # Si existe, se carga el artefacto de inferencia (liviano y mapeado en memoria); si no, el entrenador completo
+    folder = os.path.join(venv, f'{keywords["tecnica"]}-processing', 'models')
+    artifact = os.path.join(folder, f'{keywords["modelo"]}-inference')
+    if os.path.exists(os.path.join(artifact, 'schema.json')):
+        return inference_model.load(artifact, tecnica=keywords['tecnica'], modelo=keywords['modelo'])
+    path = os.path.join(folder, f'{keywords["modelo"]}-model.pkl')
     with open(path,'rb') as file:
         model = pickle.load(file)
     return model
@@ -82,17 +115,6 @@ def select_lists(*args):
     else:
         return None
 
-def dump_object(obj,filename):
-    if os.path.exists(filename):
-        with open(filename,'rb') as file:
-            data = pickle.load(file)
-        data.append(obj)
-    else:
-        data = [obj]
-        
-    with open(filename,'wb') as file:
-        pickle.dump(data,file)
-
 def show_CM(CM: pd.DataFrame,way='pandas-style'):
     if way=='pandas-style':
         stylish = CM.style.background_gradient(cmap='coolwarm').set_precision(2)
@@ -110,33 +132,834 @@ def show_CM(CM: pd.DataFrame,way='pandas-style'):
     else:
         raise AttributeError("'way' debe ser o 'pandas-style' (predeterminado) o 'seaborn'." )
 
+def path_parts(path: str) -> list:
+    # Separa la ruta tanto con '\\' (Windows) como con '/'
+    return re.split(r'[\\/]', path)
+
+def feature_columns(tecnica: str, dim: int) -> list:
+    if tecnica == 'graph':
+        columns = []
+        for i in range(dim // 2):
+            columns.extend([f"x_{i}", f"y_{i}"])
+        return columns
+    return [f'cell_{i}' for i in range(dim)]
+
+# --------------
+# Almacenamiento de características
+
+class feature_store:
+    # Estructura: <tecnica>-processing/processed_data/store/<split>/
+    #   shards/<id>.X.npy, <id>.letra.npy, <id>.origen.npy, <id>.json  -> escritos por cada proceso, sin candado
+    #   X.npy, letra.npy, origen.npy, manifest.json                    -> resultado consolidado (memory-mappable)
+    def __init__(self, tecnica: str, root: str = None):
+        self.tecnica = tecnica
+        self.root = root if root is not None else os.path.join(venv, f'{tecnica}-processing', 'processed_data', 'store')
+
+    def split_dir(self, split: str) -> str:
+        return os.path.join(self.root, split)
+
+    def shard_dir(self, split: str) -> str:
+        return os.path.join(self.root, split, 'shards')
+
+    def splits(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+
+    def discard_shard(self, split: str, shard_id: str):
+        prefix = os.path.join(self.shard_dir(split), shard_id)
+        # El .json primero: sin él, el shard ya no cuenta como pendiente
+        for suffix in ['.json', '.X.npy', '.letra.npy', '.origen.npy']:
+            if os.path.exists(prefix + suffix):
+                os.remove(prefix + suffix)
+
+    def pending_shards(self, split: str) -> list:
+        # Solo cuentan los shards cuyo .json ya fue escrito (es lo último que se escribe)
+        folder = self.shard_dir(split)
+        if not os.path.isdir(folder):
+            return []
+        metas = []
+        for name in os.listdir(folder):
+            if name.endswith('.json'):
+                with open(os.path.join(folder, name), 'r') as file:
+                    metas.append(json.load(file))
+        return sorted(metas, key=lambda meta: (meta['created'], meta['id']))
+
+    def exists(self, split: str = None) -> bool:
+        splits = [split] if split is not None else self.splits()
+        return any(os.path.exists(os.path.join(self.split_dir(s), 'manifest.json')) or self.pending_shards(s) for s in splits)
+
+    def manifest(self, split: str) -> dict:
+        path = os.path.join(self.split_dir(split), 'manifest.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as file:
+            return json.load(file)
+
+    def consolidate(self, split: str, valid_paths: set = None):
+        # Une el consolidado previo (si existe) con los shards pendientes y borra los shards ya unidos.
+        # Si una imagen aparece más de una vez (p. ej. se volvió a extraer porque cambió), queda la fila más
+        # reciente. Con valid_paths (llaves de image_key) se descartan las imágenes que ya no existen.
+        shards = self.pending_shards(split)
+        manifest = self.manifest(split)
+        if manifest is None and not shards:
+            return None
+        if not shards and valid_paths is None:
+            return manifest
+
+        folder = self.split_dir(split)
+        shard_folder = self.shard_dir(split)
+        parts = []
+        if manifest is not None:
+            parts.append((np.load(os.path.join(folder, 'X.npy'), mmap_mode='r'),
+                          np.load(os.path.join(folder, 'letra.npy')),
+                          np.load(os.path.join(folder, 'origen.npy'))))
+        for meta in shards:
+            prefix = os.path.join(shard_folder, meta['id'])
+            parts.append((np.load(prefix + '.X.npy', mmap_mode='r'),
+                          np.load(prefix + '.letra.npy'),
+                          np.load(prefix + '.origen.npy')))
+
+        dims = {X.shape[1] for X, _, _ in parts}
+        if len(dims) > 1:
+            raise ValueError(f'Los shards de {split} tienen dimensiones distintas: {sorted(dims)}.')
+        dim = dims.pop()
+        letras = np.concatenate([letra.astype(str) for _, letra, _ in parts])
+        origenes = np.concatenate([origen.astype(str) for _, _, origen in parts])
+        
+        # Última aparición de cada imagen (los shards van en orden de creación, después del consolidado)
+        keys = np.array([image_key(origen) for origen in origenes])
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = np.zeros(len(keys), dtype=bool)
+        keep[len(keys) - 1 - last] = True
+        if valid_paths is not None:
+            keep &= np.isin(keys, list(valid_paths))
+        rows = int(keep.sum())
+
+        # Se escribe a un archivo temporal por bloques para no cargar todo en memoria
+        tmp = os.path.join(folder, 'X.tmp.npy')
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(rows, dim))
+        start, offset = 0, 0
+        for X, _, _ in parts:
+            selected = keep[offset:offset + X.shape[0]]
+            block = X[selected] if not selected.all() else X
+            out[start:start + block.shape[0]] = block
+            start += block.shape[0]
+            offset += X.shape[0]
+        out.flush()
+        letras, origenes = letras[keep], origenes[keep]
+        # Liberar los mapeos antes de reemplazar X.npy (en Windows no se puede reemplazar un archivo abierto)
+        del out, X, parts, block
+
+        os.replace(tmp, os.path.join(folder, 'X.npy'))
+        np.save(os.path.join(folder, 'letra.npy'), letras)
+        np.save(os.path.join(folder, 'origen.npy'), origenes)
+
+        manifest = {
+            'version': 1,
+            'tecnica': self.tecnica,
+            'split': split,
+            'rows': int(rows),
+            'dim': int(dim),
+            'dtype': 'float32',
+            'columns': feature_columns(self.tecnica, dim),
+            'shards': (manifest['shards'] if manifest is not None else []) + [meta['id'] for meta in shards],
+        }
+        with open(os.path.join(folder, 'manifest.tmp.json'), 'w') as file:
+            json.dump(manifest, file)
+        os.replace(os.path.join(folder, 'manifest.tmp.json'), os.path.join(folder, 'manifest.json'))
+
+        for meta in shards:
+            self.discard_shard(split, meta['id'])
+        
+        return manifest
+
+    def merge(self, other: feature_store) -> int:
+        # Trae los datos de otro store (p. ej. el de otra máquina que extrajo otra parte con --shard) como
+        # shards pendientes de este; después hay que llamar a consolidate()
+        imported = 0
+        for split in other.splits():
+            sources = [(os.path.join(other.shard_dir(split), meta['id']), meta) for meta in other.pending_shards(split)]
+            manifest = other.manifest(split)
+            if manifest is not None:
+                # El consolidado del otro store entra como un shard más, anterior a sus shards pendientes
+                sources.insert(0, (os.path.join(other.split_dir(split), ''), {'rows': manifest['rows'], 'dim': manifest['dim'], 'created': 0.0}))
+            folder = self.shard_dir(split)
+            os.makedirs(folder, exist_ok=True)
+            for source, meta in sources:
+                shard_id = f'merge-{uuid.uuid4().hex[:12]}'
+                prefix = os.path.join(folder, shard_id)
+                separator = '' if source.endswith(os.sep) else '.'
+                for suffix in ['X.npy', 'letra.npy', 'origen.npy']:
+                    shutil.copyfile(source + separator + suffix, prefix + '.' + suffix)
+                meta = {**meta, 'id': shard_id, 'created': time.time()}
+                with open(prefix + '.tmp', 'w') as file:
+                    json.dump(meta, file)
+                os.replace(prefix + '.tmp', prefix + '.json')
+                imported += 1
+        return imported
+
+    def load(self, split: str, mmap: bool = True):
+        # Devuelve (X, letras, origenes, columnas); X queda mapeado en memoria si mmap=True
+        if self.pending_shards(split):
+            self.consolidate(split)
+        manifest = self.manifest(split)
+        if manifest is None:
+            raise FileNotFoundError(f'No hay datos consolidados para {split} en {self.root}.')
+        folder = self.split_dir(split)
+        X = np.load(os.path.join(folder, 'X.npy'), mmap_mode='r' if mmap else None)
+        letras = np.load(os.path.join(folder, 'letra.npy'))
+        origenes = np.load(os.path.join(folder, 'origen.npy'))
+        return X, letras, origenes, manifest['columns']
+
+def stream_csv_dataset(path: str, chunksize: int = 2048):
+    # Lee un CSV de características en una sola pasada por bloques. Devuelve (X float32, letras, columnas, errores),
+    # donde errores cuenta las líneas que no se pudieron leer, las filas con vacíos y las filas con texto en
+    # columnas numéricas (letras mal posicionadas). Esas filas se descartan.
+    excluded = ['Unnamed: 0', 'origen', '    ']
+    header = pd.read_csv(path, nrows=0, encoding='utf-8').columns
+    columns = [column for column in header if column not in excluded]
+    label, features = columns[0], columns[1:]
+    errors = {'lectura': 0, 'corruptas': 0, 'mal_posicionadas': 0}
+
+    # Se reserva el arreglo según el tamaño del archivo para no duplicar memoria al final
+    with open(path, 'rb') as file:
+        sample = file.read(1 << 20)
+    line_size = max(1, len(sample) // max(1, sample.count(b'\n')))
+    capacity = os.path.getsize(path) // line_size + chunksize
+    X = np.empty((capacity, len(features)), dtype=np.float32)
+    labels, rows = [], 0
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', pd.errors.ParserWarning)
+        reader = pd.read_csv(path, sep=',', encoding='utf-8', on_bad_lines='warn', usecols=columns,
+                             dtype={label: str}, chunksize=chunksize)
+        for chunk in reader:
+            chunk = chunk[columns]
+            corrupt = chunk.isna().any(axis=1).to_numpy()
+            
+            # Solo las columnas que no se leyeron como números necesitan conversión
+            values = chunk[features]
+            text_columns = [column for column in features if not pd.api.types.is_numeric_dtype(values[column])]
+            if text_columns:
+                values = values.copy()
+                values[text_columns] = values[text_columns].apply(pd.to_numeric, errors='coerce')
+            values = values.to_numpy(dtype=np.float32, na_value=np.nan)
+            misplaced = np.isnan(values).any(axis=1) & ~corrupt
+            keep = ~(corrupt | misplaced)
+            errors['corruptas'] += int(corrupt.sum())
+            errors['mal_posicionadas'] += int(misplaced.sum())
+
+            kept = int(keep.sum())
+            if rows + kept > X.shape[0]:
+                X.resize((max(rows + kept, int(X.shape[0] * 1.5)), X.shape[1]), refcheck=False)
+            X[rows:rows + kept] = values[keep]
+            rows += kept
+            labels.append(chunk[label][keep].astype(str).str.strip("b' ").str.strip().to_numpy())
+    
+    errors['lectura'] = sum(str(warning.message).count('Skipping line') for warning in caught
+                            if issubclass(warning.category, pd.errors.ParserWarning))
+    X.resize((rows, X.shape[1]), refcheck=False)
+    Y = np.concatenate(labels) if labels else np.array([], dtype=str)
+    return X, Y, features, errors
+
+class shard_writer:
+    # Acumula filas en memoria y las escribe como un shard propio por split; no necesita candado
+    def __init__(self, store: feature_store):
+        self.store = store
+        self.rows = {}
+
+    def append(self, split: str, letra: str, features, origen: str):
+        self.rows.setdefault(split, []).append((letra, np.asarray(features, dtype=np.float32).ravel(), origen))
+
+    def append_path(self, image_path: str, features):
+        # El split y la letra salen de la ruta: .../<split>/<letra>/<imagen>
+        parts = path_parts(image_path)
+        self.append(parts[-3], parts[-2], features, image_path)
+
+    def flush(self, tag: str = None) -> list:
+        # tag identifica la tarea que escribió el shard (p. ej. el bloque de extraction_runner)
+        written = []
+        for split, rows in self.rows.items():
+            if not rows:
+                continue
+            folder = self.store.shard_dir(split)
+            os.makedirs(folder, exist_ok=True)
+            shard_id = f'{os.getpid()}-{uuid.uuid4().hex[:12]}'
+            prefix = os.path.join(folder, shard_id)
+            
+            np.save(prefix + '.X.npy', np.stack([row[1] for row in rows]))
+            np.save(prefix + '.letra.npy', np.array([row[0] for row in rows]))
+            np.save(prefix + '.origen.npy', np.array([row[2] for row in rows]))
+            
+            meta = {'id': shard_id, 'rows': len(rows), 'dim': int(rows[0][1].shape[0]), 'created': time.time()}
+            if tag is not None:
+                meta['chunk'] = tag
+            with open(prefix + '.tmp', 'w') as file:
+                json.dump(meta, file)
+            os.replace(prefix + '.tmp', prefix + '.json')
+            written.append(shard_id)
+        self.rows = {}
+        return written
+
+# --------------
+# Manifiesto del dataset
+
+def image_key(path: str) -> str:
+    # Identidad de una imagen independiente de la máquina: <split>/<letra>/<archivo>
+    return '/'.join(path_parts(str(path))[-3:])
+
+class dataset_manifest:
+    # Inventario de synthetic-asl-alphabet: llave (image_key) -> split, letra, tamaño y fecha de modificación.
+    # Permite saber qué imágenes se agregaron, cambiaron o borraron desde la última extracción, y repartir
+    # el dataset en n partes estratificadas por clase para procesarlas en varias máquinas o procesos.
+    def __init__(self, root: str = None, entries: dict = None):
+        self.root = root if root is not None else os.path.join(venv, 'synthetic-asl-alphabet')
+        self.entries = entries if entries is not None else {}
+
+    @classmethod
+    def scan(cls, root: str = None, splits: tuple = ('Train_Alphabet', 'Test_Alphabet')):
+        manifest = cls(root)
+        for split in splits:
+            split_dir = os.path.join(manifest.root, split)
+            if not os.path.isdir(split_dir):
+                continue
+            for letter in sorted(os.scandir(split_dir), key=lambda entry: entry.name):
+                if not letter.is_dir():
+                    continue
+                for image in os.scandir(letter.path):
+                    if image.is_file():
+                        stat = image.stat()
+                        manifest.entries[f'{split}/{letter.name}/{image.name}'] = {
+                            'split': split, 'letra': letter.name, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        return manifest
+
+    @classmethod
+    def load(cls, path: str, root: str = None):
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        if data.get('version') != 1:
+            raise ValueError(f'Versión de manifiesto no soportada: {data.get("version")}.')
+        return cls(root, data['entries'])
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'version': 1, 'entries': self.entries}, file)
+        os.replace(path + '.tmp', path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def paths(self) -> list:
+        return [self.path(key) for key in sorted(self.entries)]
+
+    def diff(self, previous: dataset_manifest) -> dict:
+        # Cambios respecto de un manifiesto anterior (una imagen cambió si cambió su tamaño o su fecha)
+        before = previous.entries if previous is not None else {}
+        return {
+            'added': sorted(key for key in self.entries if key not in before),
+            'changed': sorted(key for key, entry in self.entries.items() if key in before
+                              and (entry['size'], entry['mtime']) != (before[key]['size'], before[key]['mtime'])),
+            'removed': sorted(key for key in before if key not in self.entries)
+        }
+
+    def shard(self, k: int, n: int) -> dataset_manifest:
+        # Parte k de n (k empieza en 1). Dentro de cada (split, letra) las imágenes se ordenan por un hash de su
+        # llave y se reparten en ronda, así que cada parte tiene la misma proporción de clases y el resultado
+        # no depende de la máquina ni del orden del sistema de archivos.
+        if not 1 <= k <= n:
+            raise ValueError(f'Shard inválido {k}/{n}: k debe estar entre 1 y n.')
+        groups = {}
+        for key, entry in self.entries.items():
+            groups.setdefault((entry['split'], entry['letra']), []).append(key)
+        selected = {}
+        for offset, group in enumerate(sorted(groups)):
+            keys = sorted(groups[group], key=lambda key: hashlib.sha1(key.encode()).hexdigest())
+            for i, key in enumerate(keys):
+                if (i + offset) % n == k - 1:
+                    selected[key] = self.entries[key]
+        return dataset_manifest(self.root, selected)
+
+def parse_shard(value: str) -> tuple:
+    # '2/4' -> (2, 4)
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', value or '')
+    if match is None:
+        raise ValueError(f"Shard inválido '{value}': se espera k/n, por ejemplo 1/4.")
+    k, n = int(match.group(1)), int(match.group(2))
+    if not 1 <= k <= n:
+        raise ValueError(f'Shard inválido {k}/{n}: k debe estar entre 1 y n.')
+    return k, n
+
+# --------------
+# Caché de características
+
+class feature_cache:
+    # Caché en disco direccionado por contenido: llave = sha256(bytes de la imagen + parámetros de la técnica)
+    def __init__(self, root: str = None, max_bytes: int = 2 * 1024**3):
+        self.root = root if root is not None else os.path.join(venv, 'cache')
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__size = None
+
+    @staticmethod
+    def key(image, params: dict, normalize: bool = True) -> str:
+        digest = hashlib.sha256()
+        if isinstance(image, str):
+            with open(image, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(block)
+        else:
+            image = np.ascontiguousarray(image)
+            digest.update(f'{image.shape}{image.dtype}'.encode())
+            digest.update(image.tobytes())
+        digest.update(json.dumps({**params, 'normalize': normalize}, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + '.npy')
+
+    def get(self, key: str):
+        path = self.__path(key)
+        try:
+            features = np.load(path)
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+        # Se actualiza la fecha para que el desalojo sea por uso reciente (LRU)
+        os.utime(path)
+        self.hits += 1
+        return features
+
+    def put(self, key: str, features):
+        path = self.__path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as file:
+            np.save(file, np.asarray(features))
+        os.replace(tmp, path)
+        
+        if self.__size is None:
+            self.__size = self.size()
+        else:
+            self.__size += os.path.getsize(path)
+        if self.__size > self.max_bytes:
+            self.evict()
+
+    def get_or_compute(self, transform, image, normalize: bool = True):
+        # Devuelve (características, instancia); la instancia es None si vino del caché
+        key = self.key(image, transform.params, normalize)
+        features = self.get(key)
+        if features is not None:
+            return features, None
+        ins = transform(image)
+        features = np.asarray(ins.extract_values(normalize=normalize))
+        self.put(key, features)
+        return features, ins
+
+    def __entries(self) -> list:
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for folder in os.listdir(self.root):
+            folder = os.path.join(self.root, folder)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith('.npy'):
+                    stat = os.stat(os.path.join(folder, name))
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(folder, name)))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.__entries())
+
+    def evict(self, target: float = 0.9):
+        # Borra las entradas usadas hace más tiempo hasta quedar por debajo de target * max_bytes
+        entries = sorted(self.__entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        self.__size = total
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0}
+
+# --------------
+# Caché de imágenes para redes
+
+class image_tensor_cache:
+    # Imágenes preprocesadas una sola vez (resize -> escala de grises) a un arreglo uint8 (N, size, size, 1):
+    #   <root>/images.npy, labels.npy, index.json (clases y, por imagen, ruta relativa, etiqueta, tamaño y fecha)
+    # images se abre mapeado en memoria, así que la RAM usada no crece con el dataset. build() solo vuelve a
+    # preprocesar si cambió alguna imagen, la lista de clases o la resolución.
+    def __init__(self, root: str, size: int = 128):
+        self.root = root
+        self.size = size
+        self.images = None
+        self.labels = None
+        self.classes = None
+        self.files = None
+
+    @staticmethod
+    def scan(dataset_dir: str) -> tuple:
+        # Misma convención que load_data en los cuadernos: una carpeta por clase, clases en orden alfabético
+        classes = sorted(entry.name for entry in os.scandir(dataset_dir) if entry.is_dir())
+        entries = []
+        for label, name in enumerate(classes):
+            for image in sorted(os.scandir(os.path.join(dataset_dir, name)), key=lambda entry: entry.name):
+                if image.is_file():
+                    stat = image.stat()
+                    entries.append({'file': f'{name}/{image.name}', 'label': label, 'size': stat.st_size, 'mtime': stat.st_mtime_ns})
+        return classes, entries
+
+    def __index(self) -> dict:
+        path = os.path.join(self.root, 'index.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def build(self, dataset_dir: str, workers: int = None, force: bool = False) -> image_tensor_cache:
+        classes, entries = self.scan(dataset_dir)
+        if not entries:
+            raise ValueError(f'No hay imágenes en {dataset_dir}.')
+        index = self.__index()
+        if (not force and index is not None and index['size'] == self.size and index['classes'] == classes
+                and index['entries'] == entries):
+            return self.load()
+
+        # El índice se borra primero y se escribe al final: un caché a medio construir nunca se considera válido
+        os.makedirs(self.root, exist_ok=True)
+        if index is not None:
+            os.remove(os.path.join(self.root, 'index.json'))
+        self.images = None
+        tmp = os.path.join(self.root, 'images.tmp.npy')
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.uint8, shape=(len(entries), self.size, self.size, 1))
+
+        def preprocess(i: int, target: np.ndarray):
+            path = os.path.join(dataset_dir, *entries[i]['file'].split('/'))
+            image = cv2.imread(path)
+            if image is None:
+                raise ValueError(f'No se pudo leer la imagen {path}.')
+            target[i, :, :, 0] = cv2.cvtColor(cv2.resize(image, (self.size, self.size)), cv2.COLOR_BGR2GRAY)
+
+        # cv2 libera el GIL al leer y redimensionar, así que alcanza con hilos
+        with ThreadPoolExecutor(workers or min(8, os.cpu_count() or 1)) as pool:
+            list(pool.map(preprocess, range(len(entries)), itertools.repeat(out, len(entries))))
+        out.flush()
+        # Liberar el mapeo antes de reemplazar images.npy (en Windows no se puede reemplazar un archivo abierto)
+        del out
+
+        os.replace(tmp, os.path.join(self.root, 'images.npy'))
+        np.save(os.path.join(self.root, 'labels.npy'), np.array([entry['label'] for entry in entries], dtype=np.int32))
+        with open(os.path.join(self.root, 'index.tmp.json'), 'w', encoding='utf-8') as file:
+            json.dump({'version': 1, 'size': self.size, 'classes': classes, 'entries': entries}, file)
+        os.replace(os.path.join(self.root, 'index.tmp.json'), os.path.join(self.root, 'index.json'))
+        return self.load()
+
+    def load(self) -> image_tensor_cache:
+        index = self.__index()
+        if index is None:
+            raise ValueError(f'No hay un caché de imágenes en {self.root}; usar build() primero.')
+        if index.get('version') != 1:
+            raise ValueError(f'Versión de caché de imágenes no soportada: {index.get("version")}.')
+        self.size = index['size']
+        self.classes = index['classes']
+        self.files = [entry['file'] for entry in index['entries']]
+        self.images = np.load(os.path.join(self.root, 'images.npy'), mmap_mode='r')
+        self.labels = np.load(os.path.join(self.root, 'labels.npy'))
+        return self
+
+    def __len__(self) -> int:
+        return 0 if self.labels is None else len(self.labels)
+
+class batch_loader:
+    # Lotes float32 en [0, 1] a partir de un image_tensor_cache (o de arreglos uint8 y etiquetas enteras).
+    # Solo se convierte el lote que se entrega y los `prefetch` siguientes se preparan en hilos mientras el
+    # modelo entrena. Con Keras: model.fit(loader.repeat(), steps_per_epoch=len(loader), epochs=...)
+    def __init__(self, images, labels: np.ndarray = None, batch_size: int = 32, shuffle: bool = True,
+                 one_hot: bool = True, num_classes: int = None, prefetch: int = 2, workers: int = 2,
+                 random_state: int = None):
+        if isinstance(images, image_tensor_cache):
+            if images.images is None:
+                images.load()
+            labels = images.labels if labels is None else labels
+            num_classes = len(images.classes) if num_classes is None else num_classes
+            images = images.images
+        if labels is not None and len(labels) != len(images):
+            raise ValueError(f'Hay {len(images)} imágenes y {len(labels)} etiquetas.')
+        self.images = images
+        self.labels = labels
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.one_hot = one_hot and labels is not None
+        self.num_classes = num_classes if num_classes is not None or labels is None else int(np.max(labels)) + 1
+        self.prefetch = prefetch
+        self.workers = workers
+        self.__rng = np.random.RandomState(random_state)
+
+    def __len__(self) -> int:
+        return math.ceil(len(self.images) / self.batch_size)
+
+    def __batch(self, indices: np.ndarray):
+        # Índices ordenados dentro del lote: lectura más secuencial del archivo mapeado
+        indices = np.sort(indices)
+        x = np.divide(self.images[indices], np.float32(255), dtype=np.float32)
+        if self.labels is None:
+            return x
+        y = np.asarray(self.labels)[indices]
+        if self.one_hot:
+            y = np.eye(self.num_classes, dtype=np.float32)[y]
+        return x, y
+
+    def __iter__(self):
+        # Una pasada (época); con shuffle el orden cambia en cada pasada
+        n = len(self.images)
+        order = self.__rng.permutation(n) if self.shuffle else np.arange(n)
+        with ThreadPoolExecutor(max(1, self.workers)) as pool:
+            pending = deque()
+            for start in range(0, n, self.batch_size):
+                pending.append(pool.submit(self.__batch, order[start:start + self.batch_size]))
+                if len(pending) > self.prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def repeat(self):
+        # Generador infinito de épocas (Keras corta cada época con steps_per_epoch)
+        while True:
+            yield from self
+
+# --------------
+# Registro de inspección
+
+class inspection_log:
+    # Archivo de solo-agregar: cada registro es [longitud en 8 bytes][pickle del registro].
+    # Agregar no vuelve a leer el archivo, y la lectura es perezosa (un registro a la vez).
+    header = struct.Struct('<Q')
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def append(self, obj):
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.filename, 'ab') as file:
+            file.write(self.header.pack(len(payload)) + payload)
+
+    def __iter__(self):
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, 'rb') as file:
+            while True:
+                head = file.read(self.header.size)
+                if len(head) < self.header.size:
+                    break
+                size, = self.header.unpack(head)
+                payload = file.read(size)
+                if len(payload) < size:
+                    # Registro truncado (p. ej. el proceso murió escribiendo); se ignora
+                    break
+                yield pickle.loads(payload)
+
+def inspection_record(obj, thumbnail: int = 64) -> dict:
+    # Resumen liviano de una instancia: características, metadatos y (opcionalmente) una miniatura
+    image_path = getattr(obj, 'image_path', None)
+    features = getattr(obj, 'coords', None) if isinstance(obj, mediapipe_landmarks) else getattr(obj, 'hog_features', None)
+    record = {
+        'clase': type(obj).__name__,
+        'origen': image_path if isinstance(image_path, str) else None,
+        'letra': path_parts(image_path)[-2] if isinstance(image_path, str) else None,
+        'results': getattr(obj, 'results', None),
+        'shape': getattr(obj, 'size', None),
+        'features': None if features is None else np.asarray(features, dtype=np.float32),
+        'thumbnail': None,
+    }
+    # En HOG, el recorte segmentado: leer obj.image dibujaría los gradientes solo para la miniatura
+    image = obj.preprocessed if isinstance(obj, hog_transform) else getattr(obj, 'image', None)
+    if thumbnail is not None and image is not None:
+        h, w = image.shape[:2]
+        scale = min(1.0, thumbnail / max(h, w))
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        record['thumbnail'] = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return record
+
+def dump_object(obj, filename, thumbnail: int = 64, full: bool = False):
+    # full=True guarda la instancia completa (imágenes incluidas), como se hacía antes
+    record = obj if full else inspection_record(obj, thumbnail)
+    inspection_log(filename).append(record)
+
+def iter_dump(path: str):
+    # Recorre un archivo de registro o todos los *.log de una carpeta
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.log'):
+                yield from inspection_log(os.path.join(path, name))
+    else:
+        yield from inspection_log(path)
+
+# --------------
+# Perfilado
+
+# Desactivado por defecto: cada operación instrumentada solo revisa esta variable. QOL_PROFILE=1 lo activa al
+# importar (útil en los procesos hijos del extractor, que vuelven a importar QoL).
+_profiling_enabled = os.environ.get('QOL_PROFILE', '') not in ['', '0']
+_profiling_stats = {}
+_profiling_lock = threading.Lock()
+
+def enable_profiling(reset: bool = True):
+    global _profiling_enabled
+    if reset:
+        reset_profiling()
+    _profiling_enabled = True
+
+def disable_profiling():
+    global _profiling_enabled
+    _profiling_enabled = False
+
+def reset_profiling():
+    with _profiling_lock:
+        _profiling_stats.clear()
+
+def output_bytes(obj) -> int:
+    # Bytes de los arreglos que produjo una operación (arreglo, tupla de arreglos o instancia con arreglos)
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (tuple, list)):
+        return sum(item.nbytes for item in obj if isinstance(item, np.ndarray))
+    if hasattr(obj, '__dict__'):
+        return sum(item.nbytes for item in vars(obj).values() if isinstance(item, np.ndarray))
+    return 0
+
+def record_profile(name: str, seconds: float, nbytes: int = 0):
+    with _profiling_lock:
+        stats = _profiling_stats.get(name)
+        if stats is None:
+            stats = _profiling_stats[name] = {'llamadas': 0, 'total_s': 0.0, 'max_s': 0.0, 'bytes': 0}
+        stats['llamadas'] += 1
+        stats['total_s'] += seconds
+        stats['max_s'] = max(stats['max_s'], seconds)
+        stats['bytes'] += nbytes
+
+def profiled(name: str, measure_self: bool = False):
+    # Decorador: registra llamadas, tiempo acumulado y bytes producidos. measure_self=True mide los arreglos
+    # de la instancia (para constructores, que devuelven None)
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _profiling_enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            record_profile(name, seconds, output_bytes(args[0] if measure_self else result))
+            return result
+        return wrapper
+    return decorator
+
+def profiling_summary() -> pd.DataFrame:
+    # Una fila por operación, de la que más tiempo consumió a la que menos. Los tiempos incluyen las
+    # operaciones anidadas (p. ej. hog_transform.__init__ incluye preprocessing_pipeline.segment)
+    with _profiling_lock:
+        stats = {name: dict(values) for name, values in _profiling_stats.items()}
+    table = pd.DataFrame.from_dict(stats, orient='index', columns=['llamadas', 'total_s', 'max_s', 'bytes'])
+    table.index.name = 'operacion'
+    table['media_ms'] = table['total_s'] / table['llamadas'].clip(lower=1) * 1000
+    table['bytes_media'] = table['bytes'] / table['llamadas'].clip(lower=1)
+    return table.sort_values('total_s', ascending=False)
+
+def dump_profiling(path: str):
+    # .json o .csv según la extensión; en JSON se agrega el pid para poder juntar los de varios procesos
+    table = profiling_summary()
+    if path.endswith('.csv'):
+        table.to_csv(path)
+    elif path.endswith('.json'):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'pid': os.getpid(), 'fecha': time.time(), 'operaciones': json.loads(table.to_json(orient='index'))}, file, indent=2)
+    else:
+        raise ValueError("El perfil solo se puede guardar como .json o .csv.")
+
 # --------------
 # Transformación de imágenes
 
+def _cuda_driver():
+    # Driver de CUDA vía ctypes: permite detectar la GPU sin importar torch
+    names = ['nvcuda.dll'] if os.name == 'nt' else ['libcuda.so.1', 'libcuda.so', 'libcuda.dylib']
+    for name in names:
+        try:
+            driver = ctypes.CDLL(name)
+        except OSError:
+            continue
+        if driver.cuInit(0) == 0:
+            return driver
+    return None
+
+def _torch_has_cuda() -> bool:
+    # Un torch compilado solo para CPU no puede usar la GPU aunque haya driver; se revisa sin importarlo
+    spec = importlib.util.find_spec('torch')
+    if spec is None or spec.origin is None:
+        return False
+    lib = os.path.join(os.path.dirname(spec.origin), 'lib')
+    return os.path.isdir(lib) and any('c10_cuda' in name for name in os.listdir(lib))
+
+def cuda_devices() -> list:
+    # Multiprocesadores de cada GPU visible (respeta CUDA_VISIBLE_DEVICES); lista vacía si no hay
+    driver = _cuda_driver()
+    if driver is None:
+        return []
+    count = ctypes.c_int(0)
+    if driver.cuDeviceGetCount(ctypes.byref(count)) != 0:
+        return []
+    devices = []
+    for index in range(count.value):
+        device, sms = ctypes.c_int(0), ctypes.c_int(0)
+        driver.cuDeviceGet(ctypes.byref(device), index)
+        # 16 = CU_DEVICE_ATTRIBUTE_MULTIPROCESSOR_COUNT
+        driver.cuDeviceGetAttribute(ctypes.byref(sms), 16, device)
+        devices.append(sms.value)
+    return devices
+
 class device_configuration:
     def __init__(self,preference: str = None):
-        # Configura la unidad de procesamiento utilizada
+        # Configura la unidad de procesamiento utilizada (sin importar torch; solo 'device' lo necesita)
+        gpus = cuda_devices() if (preference is None or preference.startswith('cuda')) and _torch_has_cuda() else []
         if preference is None:
-            if torch.cuda.is_available():
-                self.processing_unit = 'cuda:0'
-                self.device = torch.device('cuda:0')
-            else:
-                self.processing_unit = 'cpu'
-                self.device = torch.device('cpu')
+            self.processing_unit = 'cuda:0' if gpus else 'cpu'
         else:
             self.processing_unit = preference
-            self.device = torch.device(preference)
-
-        # Inicia la unidad de procesamiento para PyTorch
-        torch.cuda.device(self.device)
 
         # Consolida como variable de interés los cores máximos
-        if self.processing_unit=='cuda:0':
-            self.max_cores = torch.cuda.get_device_properties(0).multi_processor_count
+        if self.processing_unit.startswith('cuda') and gpus:
+            index = int(self.processing_unit.split(':')[1]) if ':' in self.processing_unit else 0
+            self.max_cores = gpus[index]
         else:
             self.max_cores = os.cpu_count()
+        self.__device = None
+
+    @property
+    def device(self):
+        # torch.device de la unidad elegida; torch se importa recién acá
+        if self.__device is None:
+            import torch
+            self.__device = torch.device(self.processing_unit)
+        return self.__device
 
 class image_preprocessing:
+    @profiled('image_preprocessing.__init__', measure_self=True)
     def __init__(self, image: str | np.ndarray, color: str = 'bgr'):
         if isinstance(image, str):    
             self.original_image = cv2.imread(image)
@@ -152,6 +975,7 @@ class image_preprocessing:
         self.size = self.image.shape
     
     def __to_self(func):
+        func = profiled(f'image_preprocessing.{func.__name__}')(func)
         def wrapper(self, *args, **kwargs):
             to_self = kwargs.pop('to_self', False) # Creo que es más intuitivo que to_self sea 'True' por defecto. Luego lo cambio
             result = func(self, *args, **kwargs)
@@ -222,10 +1046,8 @@ class image_preprocessing:
         return im.image, self.color
     
     def edge_detection(self):
-        gray: image_preprocessing = self.to_grayscale(to_self=False)
-        blurred: image_preprocessing = gray.blur_image(to_self=False)
-        edges = cv2.Canny(blurred.image,50,150)
-        return edges
+        # grayscale -> blur -> Canny en una sola pasada, reutilizando los buffers del hilo
+        return edge_pipeline.run(self.image)
         
     @__to_self
     def edge_enhancement(self,contrast: str = 'hard'):
@@ -259,83 +1081,578 @@ class image_preprocessing:
         return equalized_image
     
     def __find_hand_rectangle(self):
-        # Detectar los bordes
-        edges = self.edge_detection()
-        
-        # Buscar contornos y seleccionar el mayor
-        contours, _ = cv2.findContours(edges,cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        largest_contour = max(contours, key=cv2.contourArea)
-    
-        # Crear el rectángulo de ajuste
-        x, y, w, h = cv2.boundingRect(largest_contour)
-    
-        # Expandirlo para cubrir toda la palma (padding manualmente ajustable)
-        padding = 5
-        x = max(1, x - padding)
-        y = max(1, y - padding)
-        w = min(self.image.shape[1] - x, w + 2 * padding)
-        h = min(self.image.shape[0] - y, h + 2 * padding)  
-    
         # (X_POINT_START, Y_POINT_START, WIDTH, HEIGHT)
-        return (x, y, w, h)
+        return find_hand_rectangle(self.image)
     
     @__to_self
-    def segment_image(self):
-        mask = np.zeros(self.image.shape[:2], np.uint8)
-        
-        bgm = np.zeros((1,65), np.float64)
-        fgm = np.zeros((1,65), np.float64)
-
+    def segment_image(self, iterations: int = 20):
         rectangle = self.__find_hand_rectangle()
-        
-        cv2.grabCut(self.image, mask, rectangle, bgm, fgm, 20, cv2.GC_INIT_WITH_RECT)
-        
-        mask2 = np.where((mask == 2)|(mask == 0), 0, 1).astype('uint8')
+        mask2 = grabcut_mask(self.image, rectangle, iterations)
         
         segmented = self.image * mask2[:,:,np.newaxis]
         
         return segmented, self.color
 
-class mediapipe_landmarks(image_preprocessing):
-    def __init__(self, image_path, color: str = 'bgr'):
+# --------------
+# Pipeline de preprocesamiento
+
+def find_hand_rectangle(image: np.ndarray, padding: int = 5) -> tuple:
+    # Detectar los bordes
+    edges = edge_pipeline.run(image, copy=False)
+    
+    # Buscar contornos y seleccionar el mayor
+    contours, _ = cv2.findContours(edges,cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    largest_contour = max(contours, key=cv2.contourArea)
+
+    # Crear el rectángulo de ajuste
+    x, y, w, h = cv2.boundingRect(largest_contour)
+
+    # Expandirlo para cubrir toda la palma (padding manualmente ajustable)
+    x = max(1, x - padding)
+    y = max(1, y - padding)
+    w = min(image.shape[1] - x, w + 2 * padding)
+    h = min(image.shape[0] - y, h + 2 * padding)  
+
+    # (X_POINT_START, Y_POINT_START, WIDTH, HEIGHT)
+    return (x, y, w, h)
+
+def grabcut_mask(image: np.ndarray, rectangle: tuple, iterations: int = 20) -> np.ndarray:
+    # Máscara binaria (0 fondo, 1 mano) a partir de GrabCut inicializado con el rectángulo
+    mask = np.zeros(image.shape[:2], np.uint8)
+    bgm = np.zeros((1,65), np.float64)
+    fgm = np.zeros((1,65), np.float64)
+    
+    cv2.grabCut(image, mask, rectangle, bgm, fgm, iterations, cv2.GC_INIT_WITH_RECT)
+    
+    return np.where((mask == 2)|(mask == 0), 0, 1).astype('uint8')
+
+def border_confidence(mask: np.ndarray, rectangle: tuple) -> float:
+    # Qué tan contenida quedó la mano en el rectángulo: fracción del borde del rectángulo que es fondo.
+    # 1.0 si la mano quedó adentro con margen; baja si la mano se sale por los lados; 0.0 si no hay mano.
+    x, y, w, h = rectangle
+    region = mask[y:y + h, x:x + w]
+    if region.size == 0 or not region.any():
+        return 0.0
+    border = np.concatenate([region[0], region[-1], region[1:-1, 0], region[1:-1, -1]])
+    return 1.0 - np.count_nonzero(border) / border.size
+
+class hand_tracker:
+    # Lleva el rectángulo de la mano de un cuadro de video al siguiente (guardado en fracciones del cuadro, así
+    # vale a cualquier resolución). track() devuelve el rectángulo con padding o None cuando hay que volver a
+    # detectarlo: sin rectángulo previo, confianza del último cuadro bajo min_confidence, contenido de la región
+    # con una diferencia media mayor a motion_threshold (0-255) respecto del cuadro anterior, o max_reuse cuadros
+    # seguidos sin detectar.
+    def __init__(self, padding: float = 0.15, min_confidence: float = 0.5, motion_threshold: float = 12.0,
+                 max_reuse: int = 30, size: tuple = (16, 16)):
+        self.padding = padding
+        self.min_confidence = min_confidence
+        self.motion_threshold = motion_threshold
+        self.max_reuse = max_reuse
+        self.size = size
+        self.detections = 0
+        self.reused = 0
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def params(self) -> dict:
+        return {'padding': self.padding, 'min_confidence': self.min_confidence,
+                'motion_threshold': self.motion_threshold, 'max_reuse': self.max_reuse}
+
+    def reset(self):
+        self.confidence = 0.0
+        self.__box = None
+        self.__reference = None
+        self.__streak = 0
+
+    def rectangle(self, shape: tuple) -> tuple:
+        # (x, y, w, h) en píxeles para un cuadro de esta forma, con padding y recortado al cuadro
+        if self.__box is None:
+            return None
+        height, width = shape[:2]
+        x0, y0, x1, y1 = self.__box
+        pad_x, pad_y = (x1 - x0) * self.padding, (y1 - y0) * self.padding
+        x0, x1 = max(0, int((x0 - pad_x) * width)), min(width, int(math.ceil((x1 + pad_x) * width)))
+        y0, y1 = max(0, int((y0 - pad_y) * height)), min(height, int(math.ceil((y1 + pad_y) * height)))
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def __thumbnail(self, frame: np.ndarray, rectangle: tuple) -> np.ndarray:
+        x, y, w, h = rectangle
+        region = frame[y:y + h, x:x + w]
+        if region.ndim == 3:
+            region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(region, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def track(self, frame: np.ndarray) -> tuple:
+        with self.__lock:
+            rectangle = self.rectangle(frame.shape)
+            if (rectangle is None or self.confidence < self.min_confidence or self.__streak >= self.max_reuse
+                    or np.mean(np.abs(self.__thumbnail(frame, rectangle) - self.__reference)) > self.motion_threshold):
+                self.__streak = 0
+                self.detections += 1
+                return None
+            self.__streak += 1
+            self.reused += 1
+            return rectangle
+
+    def update(self, frame: np.ndarray, rectangle: tuple, confidence: float = 1.0):
+        # rectangle: (x, y, w, h) ajustado a la mano en este cuadro (sin padding); None si no se encontró
+        with self.__lock:
+            self.confidence = confidence if rectangle is not None else 0.0
+            if rectangle is None or rectangle[2] < 1 or rectangle[3] < 1:
+                self.__box = None
+                return
+            height, width = frame.shape[:2]
+            x, y, w, h = rectangle
+            self.__box = (x / width, y / height, (x + w) / width, (y + h) / height)
+            padded = self.rectangle(frame.shape)
+            self.__reference = self.__thumbnail(frame, padded) if padded is not None else None
+            if padded is None:
+                self.__box = None
+
+class segmentation_engine:
+    # Segmentación configurable de la mano:
+    #   'grabcut': GrabCut; con tol se detiene cuando la máscara deja de cambiar (si no, corre todas las iteraciones)
+    #   'skin':    umbral de color de piel en YCrCb (muy barato)
+    #   'hull':    envolvente convexa de los landmarks de MediaPipe
+    # scale < 1 calcula la máscara en menor resolución y la reescala; reuse=True sigue a la mano entre cuadros
+    # (pensado para video, no para imágenes independientes): con un hand_tracker por hilo se reutilizan el
+    # rectángulo y los modelos GMM del cuadro anterior, GrabCut corre solo sobre la región alrededor de la mano y
+    # el rectángulo se vuelve a detectar cuando la mano se sale de él o hay mucho movimiento. tracking son los
+    # argumentos del hand_tracker.
+    modes = ('grabcut', 'skin', 'hull')
+
+    def __init__(self, mode: str = 'grabcut', iterations: int = 20, tol: float = None, scale: float = 1.0,
+                 reuse: bool = False, padding: int = 5, tracking: dict = None):
+        if mode not in self.modes:
+            raise ValueError(f"'mode' debe ser uno de {self.modes}.")
+        self.mode = mode
+        self.iterations = iterations
+        self.tol = tol
+        self.scale = scale
+        self.reuse = reuse
+        self.padding = padding
+        self.tracking = dict(tracking or {})
+        self.__local = threading.local()
+        self.__generation = 0
+
+    def params(self) -> dict:
+        params = {'mode': self.mode, 'iterations': self.iterations, 'tol': self.tol, 'scale': self.scale,
+                  'reuse': self.reuse, 'padding': self.padding}
+        # Solo con seguimiento, para no cambiar la llave del caché de los motores existentes
+        if self.reuse and self.tracking:
+            params['tracking'] = self.tracking
+        return params
+
+    def feature_params(self) -> dict:
+        # Parámetros que deciden si un modelo sirve para estas características. tol, reuse y tracking cambian un
+        # poco la máscara (y por eso siguen en params(), que es la llave del caché), pero no el tipo de
+        # segmentación: un modelo entrenado con GrabCut completo se puede usar con el motor de video.
+        params = {**self.params(), 'tol': None, 'reuse': False}
+        params.pop('tracking', None)
+        return params
+
+    def reset(self):
+        # El estado es por hilo: cada hilo lo descarta en su próximo cuadro (reset puede llamarse desde otro hilo)
+        self.__generation += 1
+
+    def __state(self):
+        if getattr(self.__local, 'generation', None) != self.__generation:
+            self.__local.generation = self.__generation
+            self.__local.state = None
+            if getattr(self.__local, 'tracker', None) is not None:
+                self.__local.tracker.reset()
+        return self.__local.state
+
+    @property
+    def tracker(self) -> hand_tracker:
+        # Un seguidor por hilo: con varios hilos, cada uno ve su propia secuencia de cuadros
+        tracker = getattr(self.__local, 'tracker', None)
+        if tracker is None:
+            tracker = self.__local.tracker = hand_tracker(**self.tracking)
+        return tracker
+
+    def __grabcut(self, image: np.ndarray) -> np.ndarray:
+        state = self.__state() if self.reuse else None
+        tracked = self.tracker.track(image) if state is not None and state['shape'] == image.shape else None
+        if tracked is not None:
+            # Si el rectángulo toca algún borde del cuadro, el recorte queda sin fondo de ese lado y GrabCut
+            # tiende a marcar todo como mano: se vuelve a detectar en el cuadro completo
+            x, y, w, h = tracked
+            if x <= 0 or y <= 0 or x + w >= image.shape[1] or y + h >= image.shape[0]:
+                tracked = None
+        if tracked is not None:
+            # Solo la región alrededor del rectángulo (con el mismo margen de fondo a cada lado) pasa por GrabCut
+            x, y, w, h = tracked
+            margin = max(w, h) // 2
+            x0, y0 = max(0, x - margin), max(0, y - margin)
+            x1, y1 = min(image.shape[1], x + w + margin), min(image.shape[0], y + h + margin)
+            full, origin = image, (x0, y0)
+            image = np.ascontiguousarray(image[y0:y1, x0:x1])
+            rectangle = (x - x0, y - y0, w, h)
+            bgm, fgm = state['bgm'].copy(), state['fgm'].copy()
+            # Misma inicialización que GC_INIT_WITH_RECT, pero partiendo de los GMM del cuadro anterior
+            mask = np.full(image.shape[:2], cv2.GC_BGD, np.uint8)
+            mask[rectangle[1]:rectangle[1] + h, rectangle[0]:rectangle[0] + w] = cv2.GC_PR_FGD
+            first_mode = cv2.GC_EVAL
+        else:
+            full, origin = image, (0, 0)
+            rectangle = find_hand_rectangle(image, self.padding)
+            bgm = np.zeros((1,65), np.float64)
+            fgm = np.zeros((1,65), np.float64)
+            mask = np.zeros(image.shape[:2], np.uint8)
+            first_mode = cv2.GC_INIT_WITH_RECT
+
+        if self.tol is None:
+            cv2.grabCut(image, mask, rectangle, bgm, fgm, self.iterations, first_mode)
+        else:
+            # Iteración a iteración (equivale a una sola llamada con el mismo total), cortando al converger
+            cv2.grabCut(image, mask, rectangle, bgm, fgm, 1, first_mode)
+            previous = (mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD)
+            for _ in range(self.iterations - 1):
+                cv2.grabCut(image, mask, rectangle, bgm, fgm, 1, cv2.GC_EVAL)
+                current = (mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD)
+                changed = np.count_nonzero(current != previous) / current.size
+                previous = current
+                if changed <= self.tol:
+                    break
+
+        mask = np.where((mask == 2)|(mask == 0), 0, 1).astype('uint8')
+        if origin != (0, 0) or mask.shape != full.shape[:2]:
+            region = mask
+            mask = np.zeros(full.shape[:2], np.uint8)
+            mask[origin[1]:origin[1] + region.shape[0], origin[0]:origin[0] + region.shape[1]] = region
+            rectangle = (rectangle[0] + origin[0], rectangle[1] + origin[1], rectangle[2], rectangle[3])
+
+        if self.reuse:
+            # El próximo cuadro parte del rectángulo ajustado a la máscara de este
+            self.__local.state = {'shape': full.shape, 'bgm': bgm, 'fgm': fgm}
+            fitted = cv2.boundingRect(mask) if mask.any() else None
+            self.tracker.update(full, fitted, border_confidence(mask, rectangle))
+        return mask
+
+    def __skin(self, image: np.ndarray) -> np.ndarray:
+        ycrcb = cv2.cvtColor(image, cv2.COLOR_BGR2YCrCb)
+        mask = cv2.inRange(ycrcb, (0, 133, 77), (255, 173, 127))
+        kernel = np.ones((3, 3), np.uint8)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+        
+        # Quedarse con la región conexa más grande
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask)
+        if count <= 1:
+            return np.zeros(image.shape[:2], np.uint8)
+        largest = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+        return (labels == largest).astype('uint8')
+
+    def __hull(self, image: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
+        if landmarks is None:
+            raise ValueError("El modo 'hull' necesita los landmarks de la mano.")
+        mask = np.zeros(image.shape[:2], np.uint8)
+        hull = cv2.convexHull(np.asarray(landmarks, dtype=np.int32).reshape(-1, 1, 2))
+        cv2.fillConvexPoly(mask, hull, 1)
+        if self.padding > 0:
+            mask = cv2.dilate(mask, np.ones((2 * self.padding + 1, 2 * self.padding + 1), np.uint8))
+        return mask
+
+    @profiled('segmentation_engine.mask')
+    def mask(self, image: np.ndarray, landmarks: np.ndarray = None) -> np.ndarray:
+        # Máscara binaria (0 fondo, 1 mano) del tamaño de la imagen; landmarks en píxeles de la imagen original
+        h, w = image.shape[:2]
+        small = image
+        if self.scale != 1.0:
+            size = (max(1, int(round(w * self.scale))), max(1, int(round(h * self.scale))))
+            small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            if landmarks is not None:
+                landmarks = np.asarray(landmarks) * self.scale
+
+        if self.mode == 'grabcut':
+            mask = self.__grabcut(small)
+        elif self.mode == 'skin':
+            mask = self.__skin(small)
+        else:
+            mask = self.__hull(small, landmarks)
+
+        if small is not image:
+            mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        return mask
+
+    def segment(self, image: np.ndarray, landmarks: np.ndarray = None, out: np.ndarray = None) -> np.ndarray:
+        mask = self.mask(image, landmarks)
+        return np.multiply(image, mask[:, :, np.newaxis], out=out)
+
+    def __getstate__(self):
+        return self.params()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+def compare_segmentation(images: list, engines: dict, reference: segmentation_engine = None, landmarks: list = None) -> pd.DataFrame:
+    # Latencia e IoU de cada motor contra la referencia (por defecto GrabCut completo de 20 iteraciones)
+    if reference is None:
+        reference = segmentation_engine('grabcut', iterations=20)
+    images = [cv2.imread(image) if isinstance(image, str) else image for image in images]
+    references = [reference.mask(image) for image in images]
+
+    rows = []
+    for name, engine in engines.items():
+        if engine.mode == 'hull' and landmarks is None:
+            continue
+        engine.reset()
+        times, ious = [], []
+        for i, image in enumerate(images):
+            marks = landmarks[i] if landmarks is not None else None
+            start = time.perf_counter()
+            mask = engine.mask(image, marks)
+            times.append((time.perf_counter() - start) * 1000)
+            union = np.count_nonzero(mask | references[i])
+            ious.append(np.count_nonzero(mask & references[i]) / union if union else 1.0)
+        rows.append({'motor': name, **engine.params(), 'ms_media': np.mean(times), 'ms_p50': np.percentile(times, 50),
+                     'ms_p90': np.percentile(times, 90), 'iou_media': np.mean(ious), 'iou_min': np.min(ious)})
+    return pd.DataFrame(rows)
+
+class preprocessing_pipeline:
+    # Cadena declarativa de operaciones: se registra primero y se ejecuta de una sola vez.
+    # Cada paso escribe en un buffer propio (dst=) que se reutiliza entre imágenes del mismo hilo.
+    def __init__(self, ops: list = None):
+        self.ops = list(ops) if ops is not None else []
+        self.__local = threading.local()
+
+    def __add(self, op: str, **kwargs):
+        # Devuelve un pipeline nuevo para que las definiciones compartidas no se modifiquen
+        return preprocessing_pipeline(self.ops + [(op, kwargs)])
+
+    def resize(self, pixels: int):
+        return self.__add('resize', pixels=pixels)
+
+    def grayscale(self):
+        return self.__add('grayscale')
+
+    def rgb(self):
+        return self.__add('rgb')
+
+    def blur(self, ksize: int = 7):
+        return self.__add('blur', ksize=ksize)
+
+    def canny(self, low: int = 50, high: int = 150):
+        return self.__add('canny', low=low, high=high)
+
+    def segment(self, iterations: int = 20, engine: segmentation_engine = None):
+        if engine is None:
+            engine = segmentation_engine('grabcut', iterations=iterations)
+        return self.__add('segment', engine=engine)
+
+    def params(self) -> list:
+        return [[op, {k: v.params() if isinstance(v, segmentation_engine) else v for k, v in kwargs.items()}] for op, kwargs in self.ops]
+
+    def __buffer(self, step: int, shape: tuple, dtype=np.uint8) -> np.ndarray:
+        buffers = self.__local.__dict__.setdefault('buffers', {})
+        buf = buffers.get(step)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype)
+            buffers[step] = buf
+        return buf
+
+    def __step(self, step: int, op: str, kwargs: dict, image: np.ndarray) -> np.ndarray:
+        if op == 'resize':
+            pixels = kwargs['pixels']
+            dst = self.__buffer(step, (pixels, pixels) + image.shape[2:], image.dtype)
+            return cv2.resize(image, (pixels, pixels), dst=dst)
+        elif op == 'grayscale':
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self.__buffer(step, image.shape[:2], image.dtype))
+        elif op == 'rgb':
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self.__buffer(step, image.shape, image.dtype))
+        elif op == 'blur':
+            ksize = kwargs['ksize']
+            return cv2.GaussianBlur(image, (ksize, ksize), 0, dst=self.__buffer(step, image.shape, image.dtype))
+        elif op == 'canny':
+            return cv2.Canny(image, kwargs['low'], kwargs['high'], edges=self.__buffer(step, image.shape[:2]))
+        elif op == 'segment':
+            return kwargs['engine'].segment(image, out=self.__buffer(step, image.shape, image.dtype))
+        else:
+            raise ValueError(f'Operación no reconocida: {op}')
+
+    def run(self, image, copy: bool = True) -> np.ndarray:
+        # copy=False devuelve el buffer interno: se sobrescribe en la siguiente llamada del mismo hilo
+        if isinstance(image, str):
+            image = cv2.imread(image)
+        for step, (op, kwargs) in enumerate(self.ops):
+            if _profiling_enabled:
+                start = time.perf_counter()
+                image = self.__step(step, op, kwargs, image)
+                record_profile(f'preprocessing_pipeline.{op}', time.perf_counter() - start, image.nbytes)
+            else:
+                image = self.__step(step, op, kwargs, image)
+        return image.copy() if copy else image
+
+    def run_batch(self, images: list) -> np.ndarray:
+        # Aplica el pipeline a un lote y apila los resultados en un solo arreglo preasignado
+        out = None
+        for i, image in enumerate(images):
+            result = self.run(image, copy=False)
+            if out is None:
+                out = np.empty((len(images),) + result.shape, result.dtype)
+            out[i] = result
+        return out
+
+    def __getstate__(self):
+        return {'ops': self.ops}
+
+    def __setstate__(self, state):
+        self.ops = state['ops']
+        self.__local = threading.local()
+
+edge_pipeline = preprocessing_pipeline().grayscale().blur(7).canny(50, 150)
+
+# --------------
+# Sesiones de detección
+
+_sesiones = threading.local()
+
+class hands_session:
+    # static_image_mode=False es el modo video: MediaPipe busca la palma solo en el primer cuadro o cuando la
+    # confianza del seguimiento cae bajo min_tracking_confidence; en el resto corre el modelo de landmarks sobre
+    # la región de la mano del cuadro anterior. Cada sesión en modo video debe recibir una sola secuencia de cuadros.
+    def __init__(self, static_image_mode: bool = True, max_num_hands: int = 1, min_detection_confidence: float = 0.5,
+                 min_tracking_confidence: float = 0.5):
         import mediapipe as mp
+        self.mp_hands = mp.solutions.hands
+        self.mp_drawing = mp.solutions.drawing_utils
+        self.hands = self.mp_hands.Hands(static_image_mode=static_image_mode, max_num_hands=max_num_hands, min_detection_confidence=min_detection_confidence,
+                                         min_tracking_confidence=min_tracking_confidence)
+        self.closed = False
+
+    @profiled('hands_session.process')
+    def process(self, image: np.ndarray):
+        # Los modelos se entrenaron pasando a MediaPipe la imagen tal cual la entrega cv2 (BGR).
+        # Antes se procesaba dos veces la misma imagen; en modo estático ambas llamadas dan lo mismo (en modo
+        # video la segunda ya partiría del seguimiento de la primera).
+        if self.closed:
+            raise RuntimeError('La sesión de MediaPipe ya fue cerrada.')
+        return select_lists(self.hands.process(image))
+
+    def close(self):
+        if not self.closed:
+            self.hands.close()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def get_hands_session(**kwargs) -> hands_session:
+    # Una sesión por hilo (y por lo tanto por proceso) para cada configuración
+    if not hasattr(_sesiones, 'hands'):
+        _sesiones.hands = {}
+    key = tuple(sorted(kwargs.items()))
+    session = _sesiones.hands.get(key)
+    if session is None or session.closed:
+        session = hands_session(**kwargs)
+        _sesiones.hands[key] = session
+    return session
+
+def close_hands_sessions():
+    for session in getattr(_sesiones, 'hands', {}).values():
+        session.close()
+    _sesiones.hands = {}
+
+def landmark_coords(results, shape, out: np.ndarray = None) -> np.ndarray:
+    # Coordenadas en píxeles de los 21 nodos de la primera mano; ceros si no hubo detección
+    if out is None:
+        out = np.zeros((21, 2))
+    if results is None:
+        out[:] = 0
+        return out
+    h, w = shape[:2]
+    for idx, landmark in enumerate(results.multi_hand_landmarks[0].landmark[:21]):
+        out[idx, 0] = int(landmark.x * w)
+        out[idx, 1] = int(landmark.y * h)
+    return out
+
+def normalize_landmarks(coords: np.ndarray) -> np.ndarray:
+    # Min-max por muestra y por eje sobre (..., 21, 2), en una sola operación para todo el lote.
+    # Sigue los mismos pasos que MinMaxScaler (X * scale + min) para obtener exactamente los mismos valores.
+    coords = np.asarray(coords, dtype=np.float64)
+    data_min = coords.min(axis=-2, keepdims=True)
+    data_range = coords.max(axis=-2, keepdims=True) - data_min
+    data_range[data_range < 10 * np.finfo(np.float64).eps] = 1.0
+    scale = 1.0 / data_range
+    result = coords * scale
+    result += 0 - data_min * scale
+    return result
+
+def extract_landmarks(images: list, session: hands_session = None, return_mask: bool = False):
+    # Procesa varias imágenes (rutas o arreglos) con una sola sesión y devuelve un arreglo float32 (N, 21, 2)
+    if session is None:
+        session = get_hands_session()
+    
+    coords = np.zeros((len(images), 21, 2), dtype=np.float32)
+    detected = np.zeros(len(images), dtype=bool)
+    for i, image in enumerate(images):
+        if isinstance(image, str):
+            image = cv2.imread(image)
+        results = session.process(image)
+        if results is not None:
+            landmark_coords(results, image.shape, out=coords[i])
+            detected[i] = True
+    
+    if return_mask:
+        return coords, detected
+    return coords
+
+def landmark_features(images: list, session: hands_session = None, normalize: bool = True) -> np.ndarray:
+    # Vectores de 42 valores por imagen, iguales a los de mediapipe_landmarks.extract_values
+    coords = extract_landmarks(images, session=session)
+    if normalize:
+        return normalize_landmarks(coords).reshape(len(images), -1)
+    return coords.reshape(len(images), -1).astype(np.float64)
+
+class mediapipe_landmarks(image_preprocessing):
+    # Parámetros que determinan las características (también forman la llave del caché)
+    params = {'tecnica': 'graph', 'version': 1, 'static_image_mode': True, 'max_num_hands': 1,
+              'min_detection_confidence': 0.5, 'normalizacion': 'minmax'}
+
+    @profiled('mediapipe_landmarks.__init__', measure_self=True)
+    def __init__(self, image_path, color: str = 'bgr', session: hands_session = None):
         super().__init__(image_path,color)
         self.image_path = image_path
-        self.letter = self.image_path.split('\\')[-2]
+        self.letter = self.image_path.split('\\')[-2] if isinstance(self.image_path, str) else None
         
-        # Iniciar el framework de reconocimiento de coordenadas
-        mp_hands = mp.solutions.hands
-        hands = mp_hands.Hands(static_image_mode=True, max_num_hands=1, min_detection_confidence=0.5)
-        mp_drawing = mp.solutions.drawing_utils
+        # Reutilizar la sesión del hilo en lugar de crear un grafo nuevo por imagen
+        if session is None:
+            session = get_hands_session(static_image_mode=self.params['static_image_mode'],
+                                        max_num_hands=self.params['max_num_hands'],
+                                        min_detection_confidence=self.params['min_detection_confidence'])
 
         # Leer y procesar la imagen
         self.to_rgb(to_self=True)
         
-        
-        image_rgb: image_preprocessing = self.to_rgb(to_self=False)
-        
-        results = select_lists(hands.process(image_rgb.image), hands.process(self.original_image))
-        self.coords: np.array = np.empty((0, 2))
+        results = session.process(self.original_image)
 
         # Si hay resultados para las imágenes        
         if results is not None:
             self.results: bool = True
             # Recuperar nodos de la imagen
+            self.coords: np.array = landmark_coords(results, self.image.shape)
             for hand_landmarks in results.multi_hand_landmarks:
-                for idx, landmark in enumerate(hand_landmarks.landmark):
-                    # Extraer las coordenadas y guardarlas en lista
-                    h, w, c = self.image.shape
-                    cx, cy = int(landmark.x * w), int(landmark.y * h)
-                    self.coords = np.vstack((self.coords, np.array([cx, cy]).reshape(1, -1)))
-                mp_drawing.draw_landmarks(self.image, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+                session.mp_drawing.draw_landmarks(self.image, hand_landmarks, session.mp_hands.HAND_CONNECTIONS)
         else:
             self.results: bool = False
             self.coords = np.zeros((21, 2))
-
-        hands.close()
         
         self.__is_normalized: bool = False
 
+    @classmethod
+    def video_session(cls, min_tracking_confidence: float = 0.5) -> hands_session:
+        # Sesión del hilo en modo video para cámaras y videos. Las coordenadas siguen en píxeles del cuadro
+        # completo, así que los vectores son los mismos que en modo estático y sirven para los mismos modelos.
+        return get_hands_session(static_image_mode=False, max_num_hands=cls.params['max_num_hands'],
+                                 min_detection_confidence=cls.params['min_detection_confidence'],
+                                 min_tracking_confidence=min_tracking_confidence)
+
     def visualize_landmarks(self):     
         import matplotlib.pyplot as plt
         plt.figure(figsize=(10, 10))
@@ -344,10 +1661,8 @@ class mediapipe_landmarks(image_preprocessing):
         plt.show()
         
     def normalize_coords(self):
-        from sklearn.preprocessing import MinMaxScaler
-        scaler = MinMaxScaler()
         self.__is_normalized: bool = True
-        self.coords = scaler.fit_transform(self.coords)
+        self.coords = normalize_landmarks(self.coords)
         
     def to_csv(self,normalize: bool = True):
         if normalize==True and self.__is_normalized==False:
@@ -366,27 +1681,232 @@ class mediapipe_landmarks(image_preprocessing):
         
         df.to_csv(ruta, index=True, mode='a', header=not os.path.exists(ruta))
         
+    @profiled('mediapipe_landmarks.extract_values')
     def extract_values (self,normalize: bool = True):
         if normalize==True and self.__is_normalized==False:
             self.normalize_coords()
         else: pass
         
         return self.coords.flatten().tolist()
+
+    def to_store(self, writer: shard_writer, normalize: bool = True):
+        if normalize==True and self.__is_normalized==False:
+            self.normalize_coords()
+        else: pass
+        
+        writer.append_path(self.image_path, self.coords.flatten())
            
+# --------------
+# Motor HOG
+
+class hog_engine:
+    # HOG por lotes. backend='numpy' reproduce skimage.feature.hog paso a paso (gradiente centrado, votos duros
+    # por orientación, promedio por celda y normalización por bloque), pero vectorizado sobre todas las celdas e
+    # imágenes a la vez; backend='skimage' llama a skimage imagen por imagen (referencia).
+    # La visualización solo se calcula si se pide.
+    def __init__(self, orientations: int = 9, pixels_per_cell: tuple = (8, 8), cells_per_block: tuple = (2, 2),
+                 block_norm: str = 'L2-Hys', backend: str = 'numpy'):
+        if backend not in ['numpy', 'skimage']:
+            raise ValueError("'backend' debe ser 'numpy' o 'skimage'.")
+        if block_norm not in ['L1', 'L1-sqrt', 'L2', 'L2-Hys']:
+            raise ValueError(f'Normalización de bloque no reconocida: {block_norm}')
+        self.orientations = orientations
+        self.pixels_per_cell = tuple(pixels_per_cell)
+        self.cells_per_block = tuple(cells_per_block)
+        self.block_norm = block_norm
+        self.backend = backend
+
+    def params(self) -> dict:
+        return {'orientations': self.orientations, 'pixels_per_cell': self.pixels_per_cell,
+                'cells_per_block': self.cells_per_block, 'block_norm': self.block_norm}
+
+    def histograms(self, images: np.ndarray) -> np.ndarray:
+        # (N, alto, ancho) en grises -> (N, celdas_fila, celdas_columna, orientaciones)
+        images = np.asarray(images, dtype=np.float64)
+        n, s_row, s_col = images.shape
+        c_row, c_col = self.pixels_per_cell
+        n_row, n_col = s_row // c_row, s_col // c_col
+
+        # Gradiente centrado con bordes en cero, igual que _hog_channel_gradient
+        g_row = np.zeros_like(images)
+        g_col = np.zeros_like(images)
+        g_row[:, 1:-1, :] = images[:, 2:, :] - images[:, :-2, :]
+        g_col[:, :, 1:-1] = images[:, :, 2:] - images[:, :, :-2]
+        magnitude = np.hypot(g_col, g_row)
+        orientation = np.rad2deg(np.arctan2(g_row, g_col)) % 180
+
+        # Cada píxel vota con su magnitud en [inicio, fin) de su orientación. Los límites se calculan en float32
+        # como en _hoghistogram; un píxel que por redondeo quedó en 180 no vota en ningún intervalo (igual que allá)
+        width = np.float32(180.0 / self.orientations)
+        limits = np.array([np.float32(width * np.float32(i)) for i in range(self.orientations + 1)])
+        bins = np.searchsorted(limits[1:-1], orientation, side='right')
+        magnitude = np.where(orientation < limits[-1], magnitude, 0.0)
+
+        # Píxeles de cada celda en orden fila por fila: (N, celdas, c_row * c_col); los bordes sobrantes no votan
+        def by_cell(values):
+            values = values[:, :n_row * c_row, :n_col * c_col].reshape(n, n_row, c_row, n_col, c_col)
+            return values.transpose(0, 1, 3, 2, 4).reshape(n, n_row * n_col, c_row * c_col)
+        cells = n * n_row * n_col
+        index = np.arange(cells)[:, np.newaxis] * self.orientations + by_cell(bins).reshape(cells, -1)
+        magnitude = by_cell(magnitude).reshape(cells, -1)
+
+        # skimage acumula cada celda en un float de 32 bits, píxel por píxel: se repite ese redondeo, avanzando
+        # un píxel a la vez en todas las celdas (cada píxel solo suma en el intervalo de su orientación)
+        index, magnitude = np.ascontiguousarray(index.T), np.ascontiguousarray(magnitude.T)
+        total = np.zeros(cells * self.orientations, dtype=np.float32)
+        for k in range(c_row * c_col):
+            total[index[k]] = total[index[k]] + magnitude[k]
+        total /= np.float32(c_row * c_col)
+        return total.astype(np.float64).reshape(n, n_row, n_col, self.orientations)
+
+    def normalize(self, histograms: np.ndarray) -> np.ndarray:
+        # Bloques superpuestos de b_row x b_col celdas -> (N, bloques_fila, bloques_columna, b_row, b_col, o)
+        b_row, b_col = self.cells_per_block
+        n, n_row, n_col, o = histograms.shape
+        blocks = np.lib.stride_tricks.sliding_window_view(histograms, (b_row, b_col), axis=(1, 2))
+        blocks = np.ascontiguousarray(blocks.transpose(0, 1, 2, 4, 5, 3))
+        shape = blocks.shape
+        blocks = blocks.reshape(-1, b_row * b_col * o)
+        eps = 1e-5
+        if self.block_norm == 'L1':
+            out = blocks / (np.sum(np.abs(blocks), axis=1, keepdims=True) + eps)
+        elif self.block_norm == 'L1-sqrt':
+            out = np.sqrt(blocks / (np.sum(np.abs(blocks), axis=1, keepdims=True) + eps))
+        elif self.block_norm == 'L2':
+            out = blocks / np.sqrt(np.sum(blocks ** 2, axis=1, keepdims=True) + eps ** 2)
+        else:
+            out = blocks / np.sqrt(np.sum(blocks ** 2, axis=1, keepdims=True) + eps ** 2)
+            out = np.minimum(out, 0.2)
+            out = out / np.sqrt(np.sum(out ** 2, axis=1, keepdims=True) + eps ** 2)
+        return out.reshape(shape)
+
+    def __skimage(self, image: np.ndarray, visualize: bool):
+        from skimage.feature import hog
+        return hog(image, orientations=self.orientations, pixels_per_cell=self.pixels_per_cell,
+                   cells_per_block=self.cells_per_block, block_norm=self.block_norm, visualize=visualize)
+
+    def features(self, images: np.ndarray) -> np.ndarray:
+        # Una imagen (alto, ancho) -> vector; un lote (N, alto, ancho) -> matriz (N, características)
+        images = np.asarray(images)
+        single = images.ndim == 2
+        if single:
+            images = images[np.newaxis]
+        if self.backend == 'skimage':
+            features = np.stack([self.__skimage(image, False) for image in images])
+        else:
+            features = self.normalize(self.histograms(images)).reshape(len(images), -1)
+        return features[0] if single else features
+
+    def features_with_histogram(self, image: np.ndarray) -> tuple:
+        # Características más el histograma por celda, para dibujar los gradientes después sin recalcular
+        # (con el backend de skimage no hay histograma: render() vuelve a llamar a skimage)
+        if self.backend == 'skimage':
+            return self.features(image), None
+        histogram = self.histograms(np.asarray(image)[np.newaxis])
+        return self.normalize(histogram).ravel(), histogram[0]
+
+    def render(self, image: np.ndarray, histogram: np.ndarray = None) -> np.ndarray:
+        if histogram is None:
+            return self.__skimage(image, True)[1]
+        return self.visualize(histogram, np.asarray(image).shape)
+
+    def compute(self, image: np.ndarray, visualize: bool = False):
+        # Características de una imagen y, si se pide, la imagen de gradientes (igual que hog(visualize=True))
+        if not visualize:
+            return self.features(image)
+        features, histogram = self.features_with_histogram(image)
+        return features, self.render(image, histogram)
+
+    def visualize(self, histogram: np.ndarray, shape: tuple) -> np.ndarray:
+        # Dibuja una línea por orientación en cada celda con la intensidad del histograma (como skimage)
+        from skimage import draw
+        c_row, c_col = self.pixels_per_cell
+        n_row, n_col, _ = histogram.shape
+        radius = min(c_row, c_col) // 2 - 1
+        midpoints = np.pi * (np.arange(self.orientations) + .5) / self.orientations
+        hog_image = np.zeros(shape[:2], dtype=np.float64)
+        centres_r = (np.arange(n_row) * c_row + c_row // 2)[:, None]
+        centres_c = (np.arange(n_col) * c_col + c_col // 2)[None, :]
+        for o in range(self.orientations):
+            dr, dc = radius * np.sin(midpoints[o]), radius * np.cos(midpoints[o])
+            # La línea es la misma en cada celda, desplazada a su centro (los extremos son positivos, así que
+            # int() trunca igual que floor y el desplazamiento es exacto)
+            rr, cc = draw.line(int(c_row // 2 - dc), int(c_col // 2 + dr), int(c_row // 2 + dc), int(c_col // 2 - dr))
+            rr = (centres_r - c_row // 2)[..., None] + rr
+            cc = (centres_c - c_col // 2)[..., None] + cc
+            hog_image[rr, cc] += histogram[:, :, o][..., None]
+        return hog_image
+
 class hog_transform(image_preprocessing):
+    # Motor de segmentación (por defecto, el GrabCut de 20 iteraciones con el que se entrenaron los modelos)
+    segmenter = segmentation_engine('grabcut', iterations=20)
+
+    # Parámetros que determinan las características (también forman la llave del caché)
+    params = {'tecnica': 'gradient', 'version': 1, 'resize': 64, 'segmentacion': segmenter.params(), 'orientations': 9,
+              'pixels_per_cell': (8, 8), 'cells_per_block': (2, 2), 'block_norm': 'L2-Hys',
+              'normalizacion': 'rescale_intensity(0,10)'}
+
+    # Mismo pipeline para la extracción de entrenamiento y la inferencia en vivo
+    pipeline = preprocessing_pipeline().resize(params['resize']).segment(engine=segmenter).grayscale()
+
+    # Mismas características que skimage.feature.hog, por lotes y sin dibujar los gradientes si nadie los mira
+    engine = hog_engine(orientations=params['orientations'], pixels_per_cell=params['pixels_per_cell'],
+                        cells_per_block=params['cells_per_block'], block_norm=params['block_norm'])
+
+    @classmethod
+    def configure(cls, segmenter: segmentation_engine):
+        # Cambia el motor de segmentación (p. ej. uno más rápido para el demo). Con 'spawn', cada proceso
+        # hijo vuelve a importar QoL, así que hay que llamarlo también dentro de cada proceso.
+        cls.segmenter = segmenter
+        cls.params = {**cls.params, 'segmentacion': segmenter.params()}
+        cls.pipeline = preprocessing_pipeline().resize(cls.params['resize']).segment(engine=segmenter).grayscale()
+
+    @profiled('hog_transform.__init__', measure_self=True)
     def __init__(self, image_path, color: str = 'bgr'):
-        from skimage.feature import hog
         super().__init__(image_path,color)
         self.image_path = image_path
 
-        # Preprocesamiento
-        self.resize_image(64,to_self=True)
-        self.segment_image(to_self=True)
-        self.to_grayscale(to_self=True)
+        # Preprocesamiento: resize -> segmentación -> escala de grises en una sola pasada
+        self.image = self.pipeline.run(self.image)
+        self.color = 'gray'
+        self.size = self.image.shape
         
-        # Extracción de características con HOG
-        self.hog_features, self.hog_image = hog(self.image, orientations=9,pixels_per_cell=(8,8), cells_per_block=(2,2),block_norm='L2-Hys',visualize=True)        
+        # Extracción de características con HOG; la imagen de gradientes se dibuja recién cuando se usa
+        self.__gray = self.image
+        self.hog_features, self.__histogram = self.engine.features_with_histogram(self.image)
+        self.__hog_image = None
         self.__is_normalized: bool = False
+
+    @property
+    def preprocessed(self) -> np.ndarray:
+        # Recorte segmentado en grises sobre el que se calcula HOG
+        return self.__gray
+
+    @property
+    def hog_image(self) -> np.ndarray:
+        if self.__hog_image is None:
+            self.__hog_image = self.engine.render(self.__gray, self.__histogram)
+        return self.__hog_image
+
+    @property
+    def image(self) -> np.ndarray:
+        # Después de extract_values, la imagen es la de gradientes (para el demo y los registros de inspección)
+        return self.hog_image if self.__show_gradients else self.__image
+
+    @image.setter
+    def image(self, value: np.ndarray):
+        self.__image = value
+        self.__show_gradients = False
+
+    @classmethod
+    def extract_batch(cls, images: list, normalize: bool = True) -> np.ndarray:
+        # Características de un lote de imágenes (rutas o arreglos BGR) sin crear una instancia por imagen
+        from skimage import exposure
+        crops = cls.pipeline.run_batch([cv2.imread(image) if isinstance(image, str) else image for image in images])
+        features = cls.engine.features(crops)
+        if normalize:
+            features = exposure.rescale_intensity(features, in_range=(0, 10))
+        return features
     
     def visualize_gradients(self):
         import matplotlib.pyplot as plt
@@ -412,18 +1932,1152 @@ class hog_transform(image_preprocessing):
         
         df.to_csv(ruta, index=True, mode='a', header=not os.path.exists(ruta))
         
+    @profiled('hog_transform.extract_values')
     def extract_values (self,normalize: bool = True):
         if normalize==True and self.__is_normalized==False:
             self.normalize_hog()
         else: pass
         
-        self.image = self.hog_image
+        self.__show_gradients = True
         return self.hog_features.flatten().tolist()
 
+    def to_store(self, writer: shard_writer, normalize: bool = True):
+        if normalize==True and self.__is_normalized==False:
+            self.normalize_hog()
+        else: pass
+        
+        writer.append_path(self.image_path, self.hog_features.flatten())
+
+# --------------
+# Extracción en paralelo
+
+# Estado de cada proceso trabajador (lo arma _extraction_init una sola vez por proceso)
+_extraction_state = {}
+
+def _extraction_init(tecnica: str, store_root: str, use_cache: bool, dump_dir: str):
+    transform = globals()[EXTRACTORS[tecnica]]
+    _extraction_state.update({
+        'transform': transform,
+        'store': feature_store(tecnica, store_root),
+        'cache': feature_cache() if use_cache else None,
+        'log': os.path.join(dump_dir, f'{os.getpid()}.log') if dump_dir is not None else None
+    })
+    # El detector se crea acá y no con la primera imagen
+    if tecnica == 'graph':
+        get_hands_session(static_image_mode=transform.params['static_image_mode'],
+                          max_num_hands=transform.params['max_num_hands'],
+                          min_detection_confidence=transform.params['min_detection_confidence'])
+
+def _extraction_chunk(task: tuple) -> dict:
+    # Procesa un bloque de rutas y lo escribe como shards propios etiquetados con la llave del bloque.
+    # Una imagen que falla se salta; si falla la escritura, el bloque completo se reporta para reintentarlo.
+    key, paths = task
+    state = _extraction_state
+    writer = shard_writer(state['store'])
+    cache = state['cache']
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    errors = []
+    try:
+        for path in paths:
+            try:
+                if cache is not None:
+                    features, ins = cache.get_or_compute(state['transform'], path, normalize=True)
+                else:
+                    ins = state['transform'](path)
+                    features = np.asarray(ins.extract_values(normalize=True))
+            except Exception as error:
+                errors.append((path, f'{type(error).__name__}: {error}'))
+                continue
+            writer.append_path(path, features)
+            if ins is not None and state['log'] is not None:
+                dump_object(ins, state['log'], thumbnail=64)
+        writer.flush(tag=key)
+    except Exception as error:
+        return {'chunk': key, 'ok': False, 'error': f'{type(error).__name__}: {error}', 'paths': paths}
+    return {'chunk': key, 'ok': True, 'images': len(paths), 'errors': errors,
+            'hits': (cache.hits - hits) if cache is not None else 0,
+            'misses': (cache.misses - misses) if cache is not None else 0}
+
+class extraction_runner:
+    # Extracción de características con un pool de procesos (spawn):
+    #   - cada proceso inicializa una vez su detector/pipeline y su caché
+    #   - las rutas se reparten en bloques con imap_unordered (no hace falta tener la lista completa en memoria)
+    #   - cada bloque escribe sus propios shards (sin candados) y al final se consolidan
+    #   - checkpoint.jsonl registra los bloques terminados: si el proceso muere, run() retoma desde ahí
+    def __init__(self, tecnica: str, workers: int = None, chunk_size: int = 64, cache: bool = True,
+                 dump: bool = True, retries: int = 2, report_every: float = 2.0, store_root: str = None):
+        if tecnica not in EXTRACTORS:
+            raise ValueError('Palabra clave no identificada.')
+        self.tecnica = tecnica
+        self.workers = workers if workers is not None else max(1, (os.cpu_count() or 2) // 2)
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.dump_dir = os.path.join(venv, f'{tecnica}-processing', 'dump') if dump else None
+        self.retries = retries
+        self.report_every = report_every
+        self.store = feature_store(tecnica, store_root)
+        self.checkpoint = os.path.join(self.store.root, 'checkpoint.jsonl')
+
+    @staticmethod
+    def chunk_key(paths: list) -> str:
+        # La llave depende solo de las rutas del bloque: el mismo bloque tiene la misma llave en otra corrida
+        return hashlib.sha256('\n'.join(paths).encode()).hexdigest()[:16]
+
+    def completed(self) -> set:
+        done = set()
+        if os.path.exists(self.checkpoint):
+            with open(self.checkpoint, 'r') as file:
+                for line in file:
+                    try:
+                        done.add(json.loads(line)['chunk'])
+                    except (ValueError, KeyError):
+                        # Última línea cortada por una caída
+                        continue
+        return done
+
+    def __discard_orphans(self, done: set) -> int:
+        # Shards de bloques que no llegaron al checkpoint: se borran porque el bloque se va a repetir
+        discarded = 0
+        for split in self.store.splits():
+            for meta in self.store.pending_shards(split):
+                if 'chunk' in meta and meta['chunk'] not in done:
+                    self.store.discard_shard(split, meta['id'])
+                    discarded += 1
+        return discarded
+
+    def __chunks(self, paths, done: set, stats: dict):
+        iterator = iter(paths)
+        while True:
+            chunk = [str(path) for path in itertools.islice(iterator, self.chunk_size)]
+            if not chunk:
+                return
+            key = self.chunk_key(chunk)
+            if key in done:
+                stats['skipped'] += len(chunk)
+                continue
+            yield key, chunk
+
+    def run(self, paths, resume: bool = True, consolidate: bool = True, valid_paths: set = None) -> dict:
+        import multiprocessing
+        total = len(paths) if hasattr(paths, '__len__') else None
+        os.makedirs(self.store.root, exist_ok=True)
+        if self.dump_dir is not None:
+            os.makedirs(self.dump_dir, exist_ok=True)
+        if not resume and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        done = self.completed()
+        discarded = self.__discard_orphans(done)
+        if discarded:
+            print(f'Se descartaron {discarded} shards de bloques incompletos de una corrida anterior.')
+
+        stats = {'images': 0, 'skipped': 0, 'errors': [], 'failed_chunks': [], 'hits': 0, 'misses': 0}
+        start = last = time.perf_counter()
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(self.workers, initializer=_extraction_init,
+                          initargs=(self.tecnica, self.store.root, self.cache, self.dump_dir)) as pool, \
+                open(self.checkpoint, 'a') as checkpoint:
+            tasks = self.__chunks(paths, done, stats)
+            for attempt in range(self.retries + 1):
+                failed = []
+                for result in pool.imap_unordered(_extraction_chunk, tasks):
+                    if not result['ok']:
+                        failed.append(result)
+                        continue
+                    checkpoint.write(json.dumps({'chunk': result['chunk'], 'images': result['images'],
+                                                 'errors': len(result['errors'])}) + '\n')
+                    checkpoint.flush()
+                    stats['images'] += result['images']
+                    stats['errors'] += result['errors']
+                    stats['hits'] += result['hits']
+                    stats['misses'] += result['misses']
+
+                    now = time.perf_counter()
+                    if now - last >= self.report_every:
+                        last = now
+                        rate = stats['images'] / (now - start)
+                        progress = stats['images'] + stats['skipped']
+                        print(f'{progress}/{total if total is not None else "?"} imágenes | {rate:.1f} img/s | '
+                              f'{len(stats["errors"])} con error', flush=True)
+                if not failed:
+                    break
+                # Reintento de los bloques cuya escritura falló
+                print(f'Reintentando {len(failed)} bloques ({failed[0]["error"]}).')
+                tasks = [(result['chunk'], result['paths']) for result in failed]
+            stats['failed_chunks'] = [result['chunk'] for result in failed]
+
+        elapsed = time.perf_counter() - start
+        stats['seconds'] = elapsed
+        stats['images_per_second'] = stats['images'] / elapsed if elapsed else 0.0
+        print(f'{stats["images"]} imágenes en {elapsed:.1f} s ({stats["images_per_second"]:.1f} img/s), '
+              f'{stats["skipped"]} ya procesadas, {len(stats["errors"])} con error, caché: {stats["hits"]} aciertos')
+
+        # Solo se consolida (y se borra el checkpoint) si no quedó ningún bloque pendiente
+        if consolidate and not stats['failed_chunks']:
+            for split in self.store.splits():
+                self.store.consolidate(split, valid_paths)
+            os.remove(self.checkpoint)
+        return stats
+
+    def run_manifest(self, manifest: dataset_manifest, shard: tuple = None, incremental: bool = True,
+                     resume: bool = True) -> dict:
+        # Extracción incremental: solo las imágenes nuevas o modificadas desde la última corrida (según la foto
+        # del dataset que guarda el store) y, con shard=(k, n), solo las de la parte k de n
+        snapshot_path = os.path.join(self.store.root, 'dataset-manifest.json')
+        previous = dataset_manifest.load(snapshot_path, manifest.root) if incremental and os.path.exists(snapshot_path) else None
+        current = manifest.shard(*shard) if shard is not None else manifest
+        changes = current.diff(previous)
+        removed = [key for key in previous.entries if key not in manifest.entries] if previous is not None else []
+        todo = changes['added'] + changes['changed']
+        print(f"Dataset: {len(current)} imágenes{f' (parte {shard[0]}/{shard[1]})' if shard else ''} | "
+              f"{len(changes['added'])} nuevas, {len(changes['changed'])} modificadas, {len(removed)} borradas")
+
+        valid = set(manifest.entries)
+        if todo:
+            stats = self.run([manifest.path(key) for key in todo], resume=resume, valid_paths=valid)
+        else:
+            stats = {'images': 0, 'skipped': 0, 'errors': [], 'failed_chunks': []}
+            for split in self.store.splits():
+                self.store.consolidate(split, valid)
+        stats.update({'added': len(changes['added']), 'changed': len(changes['changed']), 'removed': len(removed)})
+
+        # La foto solo avanza con lo que quedó extraído: las imágenes con error se vuelven a intentar la próxima vez
+        if not stats['failed_chunks']:
+            failed = {image_key(path) for path, _ in stats['errors']}
+            entries = {key: entry for key, entry in (previous.entries if previous is not None else {}).items() if key in valid}
+            entries.update({key: current.entries[key] for key in todo if key not in failed})
+            dataset_manifest(manifest.root, entries).save(snapshot_path)
+        return stats
+
+# --------------
+# Inferencia en vivo
+
+class latest_frame:
+    # Buffer de un solo elemento para productor/consumidor: put() reemplaza lo que aún no se consumió
+    # (se cuenta como descartado), así el consumidor siempre procesa lo más reciente.
+    def __init__(self, drop: bool = True):
+        self.drop = drop
+        self.dropped = 0
+        self.__item = None
+        self.__full = False
+        self.__closed = False
+        self.__cond = threading.Condition()
+
+    def put(self, item, timeout: float = None) -> bool:
+        with self.__cond:
+            if self.__full and not self.drop:
+                # Sin descarte: el productor espera a que se consuma el elemento anterior
+                self.__cond.wait_for(lambda: not self.__full or self.__closed, timeout)
+                if self.__full:
+                    return False
+            if self.__full:
+                self.dropped += 1
+            self.__item = item
+            self.__full = True
+            self.__cond.notify_all()
+            return True
+
+    def get(self, timeout: float = None):
+        # Devuelve None si se agota el tiempo o si el buffer fue cerrado
+        with self.__cond:
+            if not self.__cond.wait_for(lambda: self.__full or self.__closed, timeout) or not self.__full:
+                return None
+            item = self.__item
+            self.__item = None
+            self.__full = False
+            self.__cond.notify_all()
+            return item
+
+    def close(self):
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+
+class rate_meter:
+    # FPS y latencia suavizados con media móvil exponencial
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.fps = 0.0
+        self.latency = 0.0
+        self.__last = None
+
+    def tick(self, latency: float = None):
+        now = time.perf_counter()
+        if self.__last is not None and now > self.__last:
+            self.fps = (1 - self.alpha) * self.fps + self.alpha / (now - self.__last) if self.fps else 1 / (now - self.__last)
+        self.__last = now
+        if latency is not None:
+            self.latency = (1 - self.alpha) * self.latency + self.alpha * latency if self.latency else latency
+
+class motion_gate:
+    # Decide si vale la pena volver a extraer características: compara una miniatura en grises del cuadro
+    # (o de la región de la mano) con la del último cuadro procesado. max_skip fuerza un refresco periódico.
+    def __init__(self, threshold: float = 4.0, size: tuple = (32, 32), max_skip: int = 30):
+        self.threshold = threshold
+        self.size = size
+        self.max_skip = max_skip
+        self.roi = None
+        self.processed = 0
+        self.skipped = 0
+        self.__reference = None
+        self.__streak = 0
+        self.__lock = threading.Lock()
+
+    def set_roi(self, rectangle: tuple = None):
+        # (x, y, w, h) en píxeles del cuadro; None para usar el cuadro completo
+        with self.__lock:
+            self.roi = rectangle
+            self.__reference = None
+
+    def reset(self):
+        with self.__lock:
+            self.__reference = None
+
+    def changed(self, frame: np.ndarray) -> bool:
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            frame = frame[y:y + h, x:x + w]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+        
+        with self.__lock:
+            if (self.__reference is None or self.__streak >= self.max_skip
+                    or np.mean(np.abs(small - self.__reference)) > self.threshold):
+                self.__reference = small
+                self.__streak = 0
+                self.processed += 1
+                return True
+            self.__streak += 1
+            self.skipped += 1
+            return False
+
+class prediction_smoother:
+    # Votación por mayoría sobre las últimas predicciones; en empate gana la más reciente
+    def __init__(self, window: int = 7):
+        self.window = window
+        self.history = deque(maxlen=window)
+
+    def reset(self):
+        self.history.clear()
+
+    def update(self, prediction):
+        self.history.append(prediction)
+        counts = Counter(self.history)
+        best = max(counts.values())
+        for candidate in reversed(self.history):
+            if counts[candidate] == best:
+                return candidate
+
+def memory_footprint(obj) -> dict:
+    # Bytes en arreglos de numpy alcanzables desde obj: 'residente' (en RAM) y 'mapeado' (memmap en disco)
+    seen, total = set(), {'residente': 0, 'mapeado': 0}
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.ndarray):
+            base = item
+            while isinstance(base, np.ndarray) and not isinstance(base, np.memmap) and base.base is not None:
+                base = base.base
+            total['mapeado' if isinstance(base, np.memmap) else 'residente'] += item.nbytes
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+        elif hasattr(item, '__dict__') and not isinstance(item, type):
+            stack.extend(vars(item).values())
+        elif type(item).__module__.startswith('sklearn') and hasattr(item, '__getstate__'):
+            # Árboles de Cython (KDTree, BallTree, Tree) exponen sus arreglos solo a través del estado
+            stack.append(item.__getstate__())
+    return total
+
+class model_registry:
+    # Carga los modelos de una técnica recién cuando se piden, en un hilo aparte para no bloquear la UI,
+    # y mantiene a lo sumo 'capacity' modelos en memoria (se descarta el usado hace más tiempo).
+    def __init__(self, capacity: int = 4, loader=None, workers: int = 1):
+        self.capacity = capacity
+        self.loader = loader if loader is not None else load_model
+        self.stats = {}
+        self.__models = OrderedDict()
+        self.__pending = {}
+        self.__errors = {}
+        self.__lock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='model-registry')
+
+    def __load(self, key: tuple):
+        start = time.perf_counter()
+        try:
+            model = self.loader({'tecnica': key[0], 'modelo': key[1]})
+        except Exception as error:
+            with self.__lock:
+                self.__errors[key] = error
+                self.__pending.pop(key, None)
+            return
+        seconds = time.perf_counter() - start
+        with self.__lock:
+            self.__models[key] = model
+            self.__pending.pop(key, None)
+            self.stats[key] = {'carga_s': seconds, **memory_footprint(model), 'descartado': False}
+            while len(self.__models) > self.capacity:
+                evicted, _ = self.__models.popitem(last=False)
+                self.stats[evicted]['descartado'] = True
+
+    def request(self, tecnica: str, modelos: tuple = ('knn', 'rf')):
+        # Devuelve {modelo: estimador} si todos están cargados; si no, encola los que falten y devuelve None.
+        # Si una carga falló, se relanza el error (una vez; el siguiente pedido lo reintenta).
+        if len(modelos) > self.capacity:
+            raise ValueError(f'La técnica necesita {len(modelos)} modelos y el registro solo mantiene {self.capacity}.')
+        keys = [(tecnica, modelo) for modelo in modelos]
+        with self.__lock:
+            for key in keys:
+                if key in self.__errors:
+                    raise self.__errors.pop(key)
+            missing = [key for key in keys if key not in self.__models]
+            for key in missing:
+                if key not in self.__pending:
+                    self.__pending[key] = self.__executor.submit(self.__load, key)
+            if missing:
+                return None
+            for key in keys:
+                self.__models.move_to_end(key)
+            return {key[1]: self.__models[key] for key in keys}
+
+    def get(self, tecnica: str, modelos: tuple = ('knn', 'rf'), timeout: float = None):
+        # Versión bloqueante de request()
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            models = self.request(tecnica, modelos)
+            if models is not None:
+                return models
+            with self.__lock:
+                pending = list(self.__pending.values())
+            try:
+                for future in pending:
+                    future.result(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+            except FutureTimeout:
+                return None
+
+    def loading(self, tecnica: str = None) -> bool:
+        with self.__lock:
+            return any(tecnica is None or key[0] == tecnica for key in self.__pending)
+
+    def resident(self) -> list:
+        with self.__lock:
+            return list(self.__models)
+
+    def summary(self) -> pd.DataFrame:
+        with self.__lock:
+            stats = {key: dict(value) for key, value in self.stats.items()}
+        table = pd.DataFrame.from_dict(stats, orient='index', columns=['carga_s', 'residente', 'mapeado', 'descartado'])
+        table.index = pd.MultiIndex.from_tuples(list(stats), names=['tecnica', 'modelo'])
+        return table
+
+    def close(self):
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+# --------------
+# Búsqueda de hiperparámetros
+
+def _jsonable(value):
+    # Convierte escalares de numpy a tipos nativos para poder guardarlos en JSON
+    return value.item() if isinstance(value, np.generic) else value
+
+class halving_search:
+    # Successive halving con presupuesto de tiempo: todos los candidatos empiezan con poco recurso
+    # (muestras o árboles) y solo el mejor 1/factor pasa a la siguiente ronda con factor veces más recurso.
+    #   - Los pliegues de CV y la matriz X (float32) se calculan una vez y se comparten entre candidatos.
+    #   - Con recurso 'n_estimators', los bosques se amplían con warm_start en lugar de reentrenarse.
+    #   - Cada evaluación se agrega a un log JSONL; al reanudar, lo ya evaluado no se vuelve a calcular. La primera
+    #     línea del log identifica los datos (forma y hash de X e y) y la configuración de la búsqueda: si no
+    #     coinciden, el log anterior se guarda como <log>.anterior y la búsqueda empieza de cero.
+    def __init__(self, estimator, param_distributions: dict, n_candidates: int = 100, cv: int = 5, factor: int = 3,
+                 resource: str = 'n_samples', min_resource: int = None, max_resource: int = None, budget: float = None,
+                 log_path: str = None, random_state: int = 42, verbose: int = 1):
+        if resource not in ['n_samples', 'n_estimators']:
+            raise ValueError("'resource' debe ser 'n_samples' o 'n_estimators'.")
+        self.estimator = estimator
+        self.param_distributions = dict(param_distributions)
+        self.n_candidates = n_candidates
+        self.cv = cv
+        self.factor = factor
+        self.resource = resource
+        self.min_resource = min_resource
+        self.max_resource = max_resource
+        self.budget = budget
+        self.log_path = log_path
+        self.random_state = random_state
+        self.verbose = verbose
+
+        if resource == 'n_estimators':
+            # El número de árboles deja de ser un hiperparámetro: pasa a ser el recurso
+            trees = self.param_distributions.pop('n_estimators', None)
+            if self.max_resource is None:
+                self.max_resource = int(np.max(trees)) if trees is not None else 200
+            if self.min_resource is None:
+                self.min_resource = 10
+
+        self.best_params_ = None
+        self.best_score_ = None
+        self.best_estimator_ = None
+        self.results_ = []
+
+    def __header(self, X: np.ndarray, y: np.ndarray, resources: list) -> dict:
+        digest = hashlib.sha256()
+        digest.update(X.tobytes())
+        digest.update('\n'.join(map(str, y)).encode())
+        config = {'estimador': type(self.estimator).__name__,
+                  'params': json.dumps(self.estimator.get_params(), sort_keys=True, default=str),
+                  'distribuciones': json.dumps(self.param_distributions, sort_keys=True, default=lambda v: np.asarray(v).tolist()),
+                  'n_candidates': self.n_candidates, 'cv': self.cv, 'factor': self.factor, 'resource': self.resource,
+                  'recursos': resources, 'random_state': self.random_state}
+        return {'cabecera': True, 'datos': {'forma': list(X.shape), 'hash': digest.hexdigest()}, 'config': config}
+
+    def __read_log(self, header: dict) -> dict:
+        done = {}
+        if self.log_path is None:
+            return done
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'r') as file:
+                lines = file.readlines()
+            try:
+                previous = json.loads(lines[0]) if lines else None
+            except json.JSONDecodeError:
+                previous = None
+            if previous == header:
+                for line in lines[1:]:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Última línea a medio escribir si la búsqueda se interrumpió
+                        continue
+                    done[(record['key'], record['recurso'])] = record
+                return done
+            # Otros datos u otra configuración: los scores guardados no sirven
+            os.replace(self.log_path, self.log_path + '.anterior')
+            if self.verbose:
+                print(f'El log de la búsqueda corresponde a otros datos o a otra configuración; se guardó como {self.log_path}.anterior.')
+        self.__write_log(header)
+        return done
+
+    def __write_log(self, record: dict):
+        if self.log_path is not None:
+            with open(self.log_path, 'a') as file:
+                file.write(json.dumps(record) + '\n')
+
+    @staticmethod
+    def __stratified_order(indices: np.ndarray, y: np.ndarray, rng: np.random.RandomState) -> np.ndarray:
+        # Cada fila se ubica según su posición (al azar) dentro de su clase, relativa al tamaño de la clase
+        labels = y[indices]
+        keys = np.empty(len(indices))
+        for label in np.unique(labels):
+            where = np.flatnonzero(labels == label)
+            keys[where] = (rng.permutation(len(where)) + rng.rand(len(where))) / len(where)
+        return indices[np.argsort(keys, kind='stable')]
+
+    def __evaluate(self, params: dict, resource: int, X, y, folds, subsets, forests) -> list:
+        from sklearn.base import clone
+        scores = []
+        for k, (train, test) in enumerate(folds):
+            if self.resource == 'n_estimators':
+                model = forests[k] if forests is not None and forests[k] is not None else None
+                if model is None:
+                    model = clone(self.estimator).set_params(**params, warm_start=True)
+                model.set_params(n_estimators=resource)
+                model.fit(X[train], y[train])
+                if forests is not None:
+                    forests[k] = model
+            else:
+                model = clone(self.estimator).set_params(**params)
+                train = subsets[k][:resource]
+                model.fit(X[train], y[train])
+            scores.append(float(model.score(X[test], y[test])))
+        return scores
+
+    def fit(self, X, y):
+        from sklearn.model_selection import StratifiedKFold, ParameterSampler
+        start = time.perf_counter()
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        y = np.asarray(y)
+
+        # Pliegues y subconjuntos estratificados: se calculan una sola vez. Cada subconjunto es un orden del
+        # pliegue de entrenamiento en el que cualquier prefijo mantiene la proporción de clases
+        folds = list(StratifiedKFold(n_splits=self.cv, shuffle=True, random_state=self.random_state).split(X, y))
+        rng = np.random.RandomState(self.random_state)
+        subsets = [self.__stratified_order(train, y, rng) for train, _ in folds]
+        if self.resource == 'n_samples':
+            if self.max_resource is None:
+                self.max_resource = min(len(train) for train, _ in folds)
+            if self.min_resource is None:
+                self.min_resource = max(10 * len(np.unique(y)), self.max_resource // self.factor**3)
+
+        n_rungs = 1 + max(0, int(math.floor(math.log(self.max_resource / self.min_resource, self.factor))))
+        resources = [min(self.max_resource, self.min_resource * self.factor**i) for i in range(n_rungs)]
+        resources[-1] = self.max_resource
+
+        candidates = list(ParameterSampler(self.param_distributions, self.n_candidates, random_state=self.random_state))
+        candidates = [{key: _jsonable(value) for key, value in params.items()} for params in candidates]
+        keys = [json.dumps(params, sort_keys=True) for params in candidates]
+        done = self.__read_log(self.__header(X, y, resources))
+
+        alive = list(range(len(candidates)))
+        forests = {}
+        scores = {}
+        out_of_budget = False
+        for rung, resource in enumerate(resources):
+            survivors = max(1, math.ceil(len(alive) / self.factor))
+            for cid in alive:
+                # Siempre se evalúa al menos un candidato, aunque el presupuesto se agote en la preparación
+                if self.budget is not None and scores and time.perf_counter() - start > self.budget:
+                    out_of_budget = True
+                    break
+                
+                record = done.get((keys[cid], resource))
+                if record is None:
+                    tic = time.perf_counter()
+                    try:
+                        folds_scores = self.__evaluate(candidates[cid], resource, X, y, folds, subsets,
+                                                       forests.setdefault(cid, [None] * self.cv) if self.resource == 'n_estimators' else None)
+                        score = float(np.mean(folds_scores))
+                    except ValueError as error:
+                        # Combinación inválida (p. ej. max_features='auto' en versiones nuevas de sklearn)
+                        folds_scores, score = [], None
+                        forests.pop(cid, None)
+                        if self.verbose:
+                            print(f'Candidato {cid} descartado: {error}')
+                    record = {'key': keys[cid], 'candidato': cid, 'params': candidates[cid], 'ronda': rung,
+                              'recurso': resource, 'score': score, 'folds': folds_scores,
+                              'segundos': time.perf_counter() - tic}
+                    self.__write_log(record)
+                scores[(cid, rung)] = record['score'] if record['score'] is not None else -np.inf
+                self.results_.append(record)
+
+                # Solo se conservan en memoria los bosques de quienes hoy pasarían de ronda
+                if self.resource == 'n_estimators' and len(forests) > survivors:
+                    ranked = sorted(forests, key=lambda c: scores.get((c, rung), np.inf))
+                    forests.pop(ranked[0])
+            
+            evaluated = [cid for cid in alive if (cid, rung) in scores]
+            if self.verbose:
+                print(f'Ronda {rung}: {len(evaluated)} candidatos con {self.resource}={resource} - {time.perf_counter() - start:.0f} s')
+            if out_of_budget or rung == len(resources) - 1:
+                break
+            alive = sorted(evaluated, key=lambda c: scores[(c, rung)], reverse=True)[:survivors]
+            forests = {cid: forests[cid] for cid in alive if cid in forests}
+
+        # El mejor candidato se elige entre los evaluados con más recurso
+        last_rung = max(rung for _, rung in scores)
+        best = max((cid for cid, rung in scores if rung == last_rung), key=lambda c: scores[(c, last_rung)])
+        if scores[(best, last_rung)] == -np.inf:
+            # Ningún candidato evaluado pudo entrenarse: sus parámetros no sirven para reentrenar
+            raise ValueError('Ningún candidato evaluado pudo entrenarse; revisar param_distributions (ver el log de la búsqueda).')
+        self.best_params_ = dict(candidates[best])
+        self.best_score_ = scores[(best, last_rung)]
+        if out_of_budget and self.verbose:
+            print(f'Presupuesto agotado: se usa el mejor candidato de la ronda {last_rung}.')
+
+        # Reentrenar el mejor con todos los datos y el recurso completo
+        from sklearn.base import clone
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_)
+        if self.resource == 'n_estimators':
+            self.best_params_['n_estimators'] = self.max_resource
+            self.best_estimator_.set_params(n_estimators=self.max_resource)
+        self.best_estimator_.fit(X, y)
+        return self
+
+# --------------
+# Índices de vecinos cercanos
+
+class lsh_index:
+    # Índice aproximado por hashing sensible a la localidad (proyecciones aleatorias cuantizadas, distancia L2).
+    # Cada tabla guarda las llaves ordenadas, así que la búsqueda de cubetas es un searchsorted vectorizado.
+    def __init__(self, n_tables: int = 8, n_bits: int = 8, width: float = None, random_state: int = 42):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.width = width
+        self.random_state = random_state
+
+    def __keys(self, Z: np.ndarray) -> np.ndarray:
+        # (n_tables, n) llaves int64: cada fila combina n_bits proyecciones cuantizadas
+        projected = np.einsum('nd,tdb->tnb', Z, self.projections) + self.offsets[:, None, :]
+        buckets = np.floor(projected / self.width_).astype(np.int64)
+        return np.einsum('tnb,b->tn', buckets, self.mix)
+
+    def fit(self, Z: np.ndarray):
+        Z = np.ascontiguousarray(Z, dtype=np.float32)
+        rng = np.random.RandomState(self.random_state)
+        self.data = Z
+        self.norms = np.einsum('nd,nd->n', Z, Z)
+        if self.width is None:
+            # Ancho de cubeta: el doble de la distancia típica al vecino más cercano (estimada con una muestra)
+            sample = Z[rng.choice(len(Z), min(200, len(Z)), replace=False)]
+            distances = np.sqrt(np.maximum(self.__sq_distances(sample, np.arange(len(Z))), 0))
+            distances.sort(axis=1)
+            self.width_ = float(2 * np.median(distances[:, min(1, distances.shape[1] - 1)])) or 1.0
+        else:
+            self.width_ = self.width
+        self.projections = rng.normal(size=(self.n_tables, Z.shape[1], self.n_bits)).astype(np.float32)
+        self.offsets = rng.uniform(0, self.width_, size=(self.n_tables, self.n_bits)).astype(np.float32)
+        self.mix = rng.randint(1, 2**31 - 1, size=self.n_bits).astype(np.int64)
+        
+        keys = self.__keys(Z)
+        self.order = np.argsort(keys, axis=1, kind='stable')
+        self.sorted_keys = np.take_along_axis(keys, self.order, axis=1)
+        return self
+
+    def __sq_distances(self, queries: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        data = self.data[candidates]
+        return (np.einsum('qd,qd->q', queries, queries)[:, None] - 2 * queries @ data.T + self.norms[candidates][None, :])
+
+    def query(self, Q: np.ndarray, k: int):
+        # Devuelve (distancias, índices) de los k vecinos aproximados; si una consulta junta menos de k
+        # candidatos, se resuelve por fuerza bruta
+        Q = np.ascontiguousarray(Q, dtype=np.float32)
+        keys = self.__keys(Q)
+        lo = np.stack([np.searchsorted(self.sorted_keys[t], keys[t], side='left') for t in range(self.n_tables)])
+        hi = np.stack([np.searchsorted(self.sorted_keys[t], keys[t], side='right') for t in range(self.n_tables)])
+        
+        distances = np.empty((len(Q), k), dtype=np.float32)
+        indices = np.empty((len(Q), k), dtype=np.int64)
+        everything = np.arange(len(self.data))
+        for i in range(len(Q)):
+            parts = [self.order[t, lo[t, i]:hi[t, i]] for t in range(self.n_tables)]
+            candidates = np.unique(np.concatenate(parts)) if parts else everything
+            if len(candidates) < k:
+                candidates = everything
+            d = self.__sq_distances(Q[i:i + 1], candidates)[0]
+            nearest = np.argpartition(d, k - 1)[:k] if len(d) > k else np.arange(len(d))
+            nearest = nearest[np.argsort(d[nearest], kind='stable')]
+            distances[i] = np.sqrt(np.maximum(d[nearest], 0))
+            indices[i] = candidates[nearest]
+        return distances, indices
+
+def _indexed_knn_classifier():
+    # La clase hereda de BaseEstimator/ClassifierMixin (necesario para clone y las búsquedas), así que recién
+    # se define cuando se usa, para no importar sklearn junto con QoL. Se define una sola vez: pickle exige que
+    # los modelos ya creados sigan apuntando a la misma clase que QoL.indexed_knn_classifier
+    if 'indexed_knn_classifier' in globals():
+        return globals()['indexed_knn_classifier']
+    from sklearn.base import BaseEstimator, ClassifierMixin
+
+    class indexed_knn_classifier(BaseEstimator, ClassifierMixin):
+        # KNN con reducción de dimensión (PCA) ajustada dentro del modelo, datos en float32 y un índice
+        # intercambiable: 'brute', 'kd_tree', 'ball_tree' (exactos) o 'lsh' (aproximado, solo numpy).
+        def __init__(self, n_neighbors: int = 5, weights: str = 'uniform', metric: str = 'euclidean', indice: str = 'lsh',
+                     n_components: int = 64, n_tables: int = 8, n_bits: int = 8, random_state: int = 42):
+            self.n_neighbors = n_neighbors
+            self.weights = weights
+            self.metric = metric
+            self.indice = indice
+            self.n_components = n_components
+            self.n_tables = n_tables
+            self.n_bits = n_bits
+            self.random_state = random_state
+
+        def __reduce_dims(self, X) -> np.ndarray:
+            X = np.asarray(X, dtype=np.float32)
+            if self.pca_ is not None:
+                X = self.pca_.transform(X).astype(np.float32)
+            return X
+
+        def fit(self, X, y):
+            from sklearn.decomposition import PCA
+            from sklearn.neighbors import NearestNeighbors
+            if self.indice not in ['brute', 'kd_tree', 'ball_tree', 'lsh']:
+                raise ValueError("'indice' debe ser 'brute', 'kd_tree', 'ball_tree' o 'lsh'.")
+            if self.indice == 'lsh' and self.metric not in ['euclidean', 'minkowski']:
+                raise ValueError("El índice 'lsh' solo soporta distancia euclidiana.")
+            X = np.asarray(X, dtype=np.float32)
+            self.classes_, self._y = np.unique(np.asarray(y), return_inverse=True)
+            self.n_features_in_ = X.shape[1]
+
+            self.pca_ = None
+            if self.n_components is not None and self.n_components < min(X.shape):
+                self.pca_ = PCA(n_components=self.n_components, random_state=self.random_state).fit(X)
+            Z = self.__reduce_dims(X)
+
+            if self.indice == 'lsh':
+                self.index_ = lsh_index(self.n_tables, self.n_bits, random_state=self.random_state).fit(Z)
+            else:
+                self.index_ = NearestNeighbors(algorithm=self.indice, metric=self.metric).fit(Z)
+            return self
+
+        def kneighbors(self, X, n_neighbors: int = None):
+            k = min(n_neighbors or self.n_neighbors, len(self._y))
+            Z = self.__reduce_dims(X)
+            if self.indice == 'lsh':
+                return self.index_.query(Z, k)
+            return self.index_.kneighbors(Z, n_neighbors=k)
+
+        def predict_proba(self, X) -> np.ndarray:
+            distances, indices = self.kneighbors(X)
+            if self.weights == 'distance':
+                # Igual que sklearn: si hay distancias cero, solo esos vecinos votan
+                with np.errstate(divide='ignore'):
+                    weights = 1.0 / distances
+                zero = distances == 0
+                weights[zero.any(axis=1)] = zero[zero.any(axis=1)]
+            else:
+                weights = np.ones(distances.shape)
+
+            votes = np.zeros((len(indices), len(self.classes_)))
+            np.add.at(votes, (np.repeat(np.arange(len(indices)), indices.shape[1]), self._y[indices].ravel()), weights.ravel())
+            return votes / votes.sum(axis=1, keepdims=True)
+
+        def predict(self, X) -> np.ndarray:
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    indexed_knn_classifier.__qualname__ = 'indexed_knn_classifier'
+    globals()['indexed_knn_classifier'] = indexed_knn_classifier
+    return indexed_knn_classifier
+
+def __getattr__(name):
+    # qol.indexed_knn_classifier (y pickle/joblib al cargar modelos) crea la clase en el primer acceso
+    if name == 'indexed_knn_classifier':
+        return _indexed_knn_classifier()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def knn_index_report(X_train, y_train, X_test, y_test, configs: dict, n_neighbors: int = 5) -> pd.DataFrame:
+    # Recall de vecinos, exactitud y latencia por consulta de cada configuración frente al KNN exacto actual
+    from sklearn.neighbors import KNeighborsClassifier
+    X_train, X_test = np.asarray(X_train), np.asarray(X_test)
+    exact = KNeighborsClassifier(n_neighbors=n_neighbors).fit(X_train, y_train)
+    start = time.perf_counter()
+    _, exact_neighbors = exact.kneighbors(X_test)
+    exact_pred = exact.predict(X_test)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(X_test)
+    
+    rows = [{'indice': 'KNeighborsClassifier (actual)', 'recall': 1.0, 'exactitud': np.mean(exact_pred == np.asarray(y_test)),
+             'acuerdo': 1.0, 'ms_consulta': exact_ms, 'fit_s': None}]
+    for name, model in configs.items():
+        model.set_params(n_neighbors=n_neighbors)
+        tic = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_s = time.perf_counter() - tic
+        
+        tic = time.perf_counter()
+        _, neighbors = model.kneighbors(X_test)
+        pred = model.predict(X_test)
+        ms = (time.perf_counter() - tic) * 1000 / len(X_test)
+        recall = np.mean([len(np.intersect1d(a, b)) / n_neighbors for a, b in zip(neighbors, exact_neighbors)])
+        rows.append({'indice': name, 'recall': recall, 'exactitud': np.mean(pred == np.asarray(y_test)),
+                     'acuerdo': np.mean(pred == exact_pred), 'ms_consulta': ms, 'fit_s': fit_s})
+    return pd.DataFrame(rows)
+
+# --------------
+# Bosque compilado
+
+class compiled_forest:
+    # Aplana todos los árboles de un RandomForestClassifier en arreglos contiguos (característica, umbral,
+    # hijos y probabilidades de hoja) y los evalúa en lote con numpy, sin pasar árbol por árbol por sklearn.
+    # Reproduce exactamente predict/predict_proba: mismo float32 en la entrada y misma suma en orden de árbol.
+    def __init__(self, forest):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        sizes = [tree.node_count for tree in trees]
+        self.roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        self.classes_ = forest.classes_
+        self.n_features_in_ = forest.n_features_in_
+        self.n_trees = len(trees)
+
+        import sklearn
+        normalized = tuple(int(part) for part in sklearn.__version__.split('.')[:2]) >= (1, 4)
+        feature, threshold, left, right, missing, value = [], [], [], [], [], []
+        for root, tree in zip(self.roots, trees):
+            leaf = tree.children_left == -1
+            nodes = root + np.arange(tree.node_count)
+            # Las hojas apuntan a sí mismas, así recorrer de más no cambia el resultado
+            left.append(np.where(leaf, nodes, root + tree.children_left))
+            right.append(np.where(leaf, nodes, root + tree.children_right))
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            missing.append(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, np.uint8)).astype(bool))
+            
+            # Igual que DecisionTreeClassifier.predict_proba: desde sklearn 1.4 las hojas ya guardan
+            # proporciones; antes guardaban conteos y se normalizaban al predecir
+            proba = tree.value[:, 0, :].astype(np.float64)
+            if not normalized:
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                proba = proba / normalizer
+            value.append(proba)
+
+        self.feature = np.ascontiguousarray(np.concatenate(feature), dtype=np.int32)
+        self.threshold = np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64)
+        self.left = np.ascontiguousarray(np.concatenate(left), dtype=np.int64)
+        self.right = np.ascontiguousarray(np.concatenate(right), dtype=np.int64)
+        self.missing_go_to_left = np.concatenate(missing)
+        self.value = np.ascontiguousarray(np.concatenate(value))
+
+    def apply(self, X) -> np.ndarray:
+        # Índice (global) de la hoja alcanzada en cada árbol: (n_muestras, n_árboles)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        node = np.tile(self.roots, X.shape[0])
+        rows = np.repeat(np.arange(X.shape[0]), self.n_trees)
+        # Solo se siguen moviendo los pares (muestra, árbol) que todavía no llegaron a una hoja
+        active = np.flatnonzero(self.left[node] != node)
+        while active.size:
+            current = node[active]
+            x = X[rows[active], self.feature[current]]
+            go_left = x <= self.threshold[current]
+            nan = np.isnan(x)
+            if nan.any():
+                go_left = np.where(nan, self.missing_go_to_left[current], go_left)
+            current = np.where(go_left, self.left[current], self.right[current])
+            node[active] = current
+            active = active[self.left[current] != current]
+        return node.reshape(X.shape[0], self.n_trees)
+
+    @profiled('compiled_forest.predict_proba')
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], len(self.classes_)))
+        for t in range(self.n_trees):
+            proba += self.value[leaves[:, t]]
+        proba /= self.n_trees
+        return proba
+
+    @profiled('compiled_forest.predict')
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+# --------------
+# Artefactos de inferencia
+
+# Versión del formato del artefacto; se incrementa si cambia lo que se guarda
+INFERENCE_SCHEMA = 1
+
+def extractor_params(tecnica: str):
+    # Parámetros del extractor con el que se generan las características de cada técnica
+    if tecnica not in EXTRACTORS:
+        return None
+    return json.loads(json.dumps(globals()[EXTRACTORS[tecnica]].params, default=_jsonable))
+
+def compatible_extractor(params: dict) -> dict:
+    # Versión de extractor_params con la que se validan los artefactos: ignora las opciones de video del motor
+    # de segmentación (ver segmentation_engine.feature_params)
+    if params is None or not isinstance(params.get('segmentacion'), dict):
+        return params
+    return {**params, 'segmentacion': segmentation_engine(**params['segmentacion']).feature_params()}
+
+class inference_model:
+    # Solo lo necesario para predecir: el estimador (o el bosque compilado), las clases del LabelEncoder y el
+    # esquema de características. Se guarda como carpeta: schema.json + estimator.joblib, con los arreglos
+    # grandes en archivos aparte para abrirlos mapeados en memoria en lugar de copiarlos a RAM.
+    def __init__(self, estimator, classes, columns: list, tecnica: str, modelo: str, params: dict = None):
+        self.estimator = estimator
+        self.classes = np.asarray(classes)
+        self.columns = list(columns)
+        self.tecnica = tecnica
+        self.modelo = modelo
+        self.params = params
+
+    def schema(self) -> dict:
+        import sklearn
+        return {
+            'schema': INFERENCE_SCHEMA,
+            'tecnica': self.tecnica,
+            'modelo': self.modelo,
+            'estimador': type(self.estimator).__name__,
+            'clases': [str(clase) for clase in self.classes],
+            'columnas': self.columns,
+            'n_features': len(self.columns),
+            'extractor': self.params,
+            'sklearn': sklearn.__version__
+        }
+
+    def save(self, directory: str):
+        import joblib
+        os.makedirs(directory, exist_ok=True)
+        schema_path = os.path.join(directory, 'schema.json')
+        # El esquema se escribe al final: sin él, un artefacto a medio guardar no se puede cargar
+        if os.path.exists(schema_path):
+            os.remove(schema_path)
+        joblib.dump(self.estimator, os.path.join(directory, 'estimator.joblib'))
+        with open(schema_path, 'w', encoding='utf-8') as file:
+            json.dump(self.schema(), file, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, tecnica: str = None, modelo: str = None, mmap: bool = True):
+        import joblib
+        import sklearn
+        schema_path = os.path.join(directory, 'schema.json')
+        if not os.path.exists(schema_path):
+            raise ValueError(f'No hay un artefacto de inferencia completo en {directory}.')
+        with open(schema_path, encoding='utf-8') as file:
+            schema = json.load(file)
+
+        # Validación del esquema antes de tocar el estimador
+        if schema.get('schema') != INFERENCE_SCHEMA:
+            raise ValueError(f"Versión de artefacto {schema.get('schema')} no soportada (se esperaba {INFERENCE_SCHEMA}).")
+        if tecnica is not None and schema['tecnica'] != tecnica:
+            raise ValueError(f"El artefacto es de la técnica '{schema['tecnica']}', no de '{tecnica}'.")
+        if modelo is not None and schema['modelo'] != modelo:
+            raise ValueError(f"El artefacto es del modelo '{schema['modelo']}', no de '{modelo}'.")
+        if schema['n_features'] != len(schema['columnas']):
+            raise ValueError('El esquema del artefacto está corrupto: columnas y n_features no coinciden.')
+        current = extractor_params(schema['tecnica'])
+        if (schema['extractor'] is not None and current is not None
+                and compatible_extractor(schema['extractor']) != compatible_extractor(current)):
+            raise ValueError(f"El artefacto se entrenó con otro extractor de características: {schema['extractor']} != {current}.")
+        if schema['sklearn'] != sklearn.__version__:
+            warnings.warn(f"El artefacto se guardó con sklearn {schema['sklearn']} y se está cargando con {sklearn.__version__}.")
+
+        # mmap_mode='c': los arreglos se leen del disco a demanda (copia solo si alguien los escribe)
+        estimator = joblib.load(os.path.join(directory, 'estimator.joblib'), mmap_mode='c' if mmap else None)
+        n_features = getattr(estimator, 'n_features_in_', schema['n_features'])
+        if n_features != schema['n_features']:
+            raise ValueError(f"El estimador espera {n_features} características y el esquema declara {schema['n_features']}.")
+        if len(getattr(estimator, 'classes_', schema['clases'])) != len(schema['clases']):
+            raise ValueError('El estimador y el esquema no tienen la misma cantidad de clases.')
+
+        return cls(estimator, schema['clases'], schema['columnas'], schema['tecnica'], schema['modelo'], schema['extractor'])
+
+    @profiled('inference_model.predict_proba')
+    def predict_proba(self, X) -> np.ndarray:
+        return self.estimator.predict_proba(np.asarray(X))
+
+    @profiled('inference_model.predict')
+    def predict(self, X) -> np.ndarray:
+        # El estimador predice la clase codificada; se devuelve la letra
+        return self.classes[np.asarray(self.estimator.predict(np.asarray(X)), dtype=np.int64)]
+
+# --------------
+# Evaluación
+
+_evaluation_model = None
+
+def _evaluation_init(model):
+    # Cada proceso del pool recibe el modelo una sola vez
+    global _evaluation_model
+    _evaluation_model = model
+
+def _evaluation_batch(X) -> np.ndarray:
+    return _evaluation_model.predict_proba(X)
+
+def class_auc(y_true, y_prob: np.ndarray, classes) -> np.ndarray:
+    # ROC AUC de cada clase contra el resto, todas las columnas a la vez: estadístico de Mann-Whitney con
+    # rangos promedio en los empates (es el área trapezoidal de roc_curve, sin recorrer clase por clase)
+    from scipy.stats import rankdata
+    positives = np.asarray(y_true)[:, np.newaxis] == np.asarray(classes)[np.newaxis, :]
+    n_pos = positives.sum(axis=0)
+    n_neg = len(positives) - n_pos
+    ranks = rankdata(y_prob, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        auc = ((ranks * positives).sum(axis=0) - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+    # Sin positivos o sin negativos el AUC no está definido
+    auc[(n_pos == 0) | (n_neg == 0)] = np.nan
+    return auc
+
+class evaluation_engine:
+    # Evalúa un modelo con una sola pasada de predict_proba (por lotes y, con n_jobs > 1, en un pool de
+    # procesos). Predicciones, matriz de confusión, reporte y AUC salen de esa matriz de probabilidades,
+    # que se guarda en disco: comparar modelos ya evaluados no vuelve a correr inferencia.
+    def __init__(self, cache_dir: str = None, batch_size: int = 4096, n_jobs: int = 1):
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(venv, 'cache', 'evaluation')
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+
+    @staticmethod
+    def fingerprint(model, X, y_true) -> str:
+        import joblib
+        digest = hashlib.sha256()
+        digest.update(joblib.hash(model).encode())
+        X = np.ascontiguousarray(X)
+        digest.update(f'{X.shape}{X.dtype}'.encode())
+        digest.update(X.tobytes())
+        digest.update('\n'.join(map(str, y_true)).encode())
+        return digest.hexdigest()[:24]
+
+    def probabilities(self, model, X) -> np.ndarray:
+        X = np.asarray(X)
+        batches = [X[start:start + self.batch_size] for start in range(0, len(X), self.batch_size)]
+        if self.n_jobs > 1 and len(batches) > 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(self.n_jobs, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_evaluation_init, initargs=(model,)) as pool:
+                parts = list(pool.map(_evaluation_batch, batches))
+        else:
+            parts = [model.predict_proba(batch) for batch in batches]
+        return np.concatenate(parts) if parts else np.empty((0, 0))
+
+    def __paths(self, key: str) -> tuple:
+        return os.path.join(self.cache_dir, f'{key}.npz'), os.path.join(self.cache_dir, f'{key}.json')
+
+    def evaluate(self, model, X, y_true, classes, name: str = None, cache: bool = True) -> dict:
+        # classes: etiqueta de cada columna de predict_proba (p. ej. LabelEncoder.classes_)
+        from sklearn.metrics import confusion_matrix, classification_report
+        y_true = np.asarray(y_true).astype(str)
+        classes = np.asarray(classes).astype(str)
+        key = self.fingerprint(model, X, y_true) if cache else None
+        
+        y_prob = None
+        if cache:
+            data_path, meta_path = self.__paths(key)
+            if os.path.exists(data_path):
+                with np.load(data_path) as data:
+                    y_prob = data['y_prob']
+        if y_prob is None:
+            start = time.perf_counter()
+            y_prob = self.probabilities(model, X)
+            seconds = time.perf_counter() - start
+        else:
+            seconds = 0.0
+        
+        # Misma regla que predict: la clase con mayor probabilidad (en empate, la primera)
+        y_pred = classes[np.argmax(y_prob, axis=1)]
+        labels = np.unique(np.concatenate([y_true, y_pred]))
+        CM = pd.DataFrame(confusion_matrix(y_true, y_pred, labels=labels), index=labels, columns=labels)
+        
+        # AUC por clase de las clases presentes en el conjunto de prueba
+        index = {clase: i for i, clase in enumerate(classes)}
+        present = np.array([clase for clase in np.unique(y_true) if clase in index])
+        auc = class_auc(y_true, y_prob[:, [index[clase] for clase in present]], present)
+        result = {
+            'name': name,
+            'key': key,
+            'classes': classes,
+            'y_true': y_true,
+            'y_prob': y_prob,
+            'y_pred': y_pred,
+            'report': classification_report(y_true, y_pred),
+            'CM': CM,
+            'AUC': {'perclass': dict(enumerate(auc.tolist())), 'macro': float(np.nanmean(auc))},
+            'accuracy': float(np.mean(y_pred == y_true)),
+            'inference_s': seconds
+        }
+
+        if cache and seconds > 0:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez(data_path, y_prob=y_prob)
+            with open(meta_path, 'w', encoding='utf-8') as file:
+                json.dump({'name': name, 'key': key, 'filas': int(len(y_true)), 'accuracy': result['accuracy'],
+                           'auc_macro': result['AUC']['macro'], 'inference_s': seconds, 'fecha': time.time()}, file)
+        return result
+
+    def compare(self) -> pd.DataFrame:
+        # Resumen de todas las evaluaciones guardadas, sin volver a correr ningún modelo
+        rows = []
+        if os.path.isdir(self.cache_dir):
+            for name in sorted(os.listdir(self.cache_dir)):
+                if name.endswith('.json'):
+                    with open(os.path.join(self.cache_dir, name), 'r', encoding='utf-8') as file:
+                        rows.append(json.load(file))
+        return pd.DataFrame(rows, columns=['name', 'key', 'filas', 'accuracy', 'auc_macro', 'inference_s', 'fecha'])
+
+    @staticmethod
+    def roc_curve(result: dict, clase: str) -> tuple:
+        # (fpr, tpr, umbrales) de una clase, para graficar; sale de las probabilidades ya calculadas
+        from sklearn.metrics import roc_curve
+        column = int(np.flatnonzero(result['classes'] == str(clase))[0])
+        return roc_curve(result['y_true'] == str(clase), result['y_prob'][:, column])
+
 # Acá iría la clase de CNN
 
 class model_trainer:
-    def __init__(self, tecnica: str, modelo: str):
+    def __init__(self, tecnica: str, modelo: str, fuente: str = 'auto', indice_knn: str = None):
         # keywords = {'técnica': (graph,gradient) , 'modelo':(knn,rf)}
         # Claves
         if tecnica in ['graph','gradient','neural'] and modelo in ['knn','rf','ann']:
@@ -434,53 +3088,64 @@ class model_trainer:
         
         self.dataset_path = {'train':os.path.join(venv, f'{self.representacion}-processing\processed_data\Train_Alphabet.csv'),
                              'test':os.path.join(venv, f'{self.representacion}-processing\processed_data\Test_Alphabet.csv')}
+        self.store = feature_store(self.representacion)
 
-        # Conjuntos de entrenamiento y prueba
-        train_set = pd.read_csv(self.dataset_path['train'],sep=',', encoding='utf-8',on_bad_lines='skip',usecols=lambda column: column not in ['Unnamed: 0','origen' ,'    '])
-        test_set = pd.read_csv(self.dataset_path['test'],sep=',', encoding='utf-8',on_bad_lines='skip',usecols=lambda column: column not in ['Unnamed: 0','origen' ,'    '])
-
-        # Prueba de errores
-        lines_train = sum(1 for _ in open(self.dataset_path['train']))
-        lines_test = sum(1 for _ in open(self.dataset_path['test']))
-        train_corr = train_set.isna().any(axis=1).sum()
-        test_corr = test_set.isna().any(axis=1).sum()
-        miss_T = train_set.dropna(axis=0).iloc[:,1:].apply(pd.to_numeric, errors='coerce').isna().any(axis=1)
-        miss_t = test_set.dropna(axis=0).iloc[:,1:].apply(pd.to_numeric, errors='coerce').isna().any(axis=1)        
-        
-        if (lines_train > train_set.shape[0] or lines_test > test_set.shape[0] or train_corr>0 or test_corr>0 or miss_T.sum()>0 or miss_t.sum()>0):
-            print('----- Sumilla de errores -----\n')
-            if (lines_train > train_set.shape[0] or lines_test > test_set.shape[0]):
-                print(f'Se han encontrado {lines_train - train_set.shape[0]} errores de lectura en train y {lines_test - test_set.shape[0]} en test. Borrando.')
-            if (train_corr>0 or test_corr>0):
-                print(f'Se han encontrado {train_corr} filas corruptas en train y {test_corr} en test. Borrando.')
-                train_set.dropna(axis=0,inplace=True)
-                test_set.dropna(axis=0,inplace=True)
-            if (miss_T.sum()>0 or miss_t.sum()>0):
-                print(f'Se han encontrado {miss_T.sum()} filas con letras mal posicionadas en train y {miss_t.sum()} en test. Borrando.')
-                try:
-                    train_set.drop(index=miss_T[miss_T==True].index,inplace=True)
-                except: pass
-                try:
-                    test_set.drop(index=miss_t[miss_t==True].index,inplace=True)
-                except: pass
-            print('\n------------------------------')
-                
-        # Almacenamiento de datasets
-        X_train, Y_train = train_set.iloc[:,1:].apply(pd.to_numeric, errors='coerce'), train_set.iloc[:,0].apply(lambda x: str(x.decode('utf-8')).strip("b' ") if isinstance(x, bytes) else str(x).strip("b' ")).astype('str').apply(lambda x: x.strip())
-        X_test, Y_test = test_set.iloc[:,1:].apply(pd.to_numeric, errors='coerce'), test_set.iloc[:,0].apply(lambda x: str(x.decode('utf-8')).strip("b' ") if isinstance(x, bytes) else str(x).strip("b' ")).astype('str').apply(lambda x: x.strip())
-        
-        self.train_set = [X_train,Y_train]
-        self.test_set = [X_test,Y_test]
+        # fuente: 'csv' (archivos de texto), 'store' (shards binarios) o 'auto' (store si existe)
+        if fuente == 'auto':
+            fuente = 'store' if self.store.exists() else 'csv'
+        if fuente == 'csv':
+            self.__load_csv()
+        elif fuente == 'store':
+            self.__load_store()
+        else:
+            raise ValueError("'fuente' debe ser 'auto', 'csv' o 'store'.")
+        self.fuente = fuente
+        # indice_knn: None (KNeighborsClassifier por defecto) o 'brute', 'kd_tree', 'ball_tree', 'lsh' con PCA previo
+        self.indice_knn = indice_knn
         
         # Definición de atributos auxiliares
+        from sklearn.preprocessing import LabelEncoder
         self.label = LabelEncoder()
         self.modelo = None
+        self.modelo_compilado = None
         self.param_distributions = None
         self.__is_trained = False
         self.test_report = None
         self.CM = None
         self.AUC = None
+        self.evaluacion = None
+        
+    def __load_csv(self):
+        # Conjuntos de entrenamiento y prueba: una sola pasada por bloques, validando y convirtiendo a float32
+        sets, errors = {}, {}
+        for split in ['train', 'test']:
+            X, Y, columns, errors[split] = stream_csv_dataset(self.dataset_path[split])
+            sets[split] = [pd.DataFrame(X, columns=columns, copy=False), pd.Series(Y)]
+        
+        # Prueba de errores
+        e_T, e_t = errors['train'], errors['test']
+        if any(e_T.values()) or any(e_t.values()):
+            print('----- Sumilla de errores -----\n')
+            if (e_T['lectura']>0 or e_t['lectura']>0):
+                print(f"Se han encontrado {e_T['lectura']} errores de lectura en train y {e_t['lectura']} en test. Borrando.")
+            if (e_T['corruptas']>0 or e_t['corruptas']>0):
+                print(f"Se han encontrado {e_T['corruptas']} filas corruptas en train y {e_t['corruptas']} en test. Borrando.")
+            if (e_T['mal_posicionadas']>0 or e_t['mal_posicionadas']>0):
+                print(f"Se han encontrado {e_T['mal_posicionadas']} filas con letras mal posicionadas en train y {e_t['mal_posicionadas']} en test. Borrando.")
+            print('\n------------------------------')
         
+        # Almacenamiento de datasets
+        self.train_set = sets['train']
+        self.test_set = sets['test']
+
+    def __load_store(self):
+        # Los arreglos quedan mapeados en memoria; no hay que parsear texto
+        sets = []
+        for split in ['Train_Alphabet', 'Test_Alphabet']:
+            X, letras, _, columns = self.store.load(split, mmap=True)
+            sets.append([pd.DataFrame(X, columns=columns, copy=False), pd.Series(letras.astype(str))])
+        self.train_set, self.test_set = sets
+
     def class_counts(self):  
         train_count = self.train_set[1].value_counts().reset_index()
         train_count.columns = ['Letra', 'En train']
@@ -503,7 +3168,17 @@ class model_trainer:
         return consolidate
         
     def __setup_model(self):
-        if self.clave_modelo == 'knn':
+        from sklearn.neighbors import KNeighborsClassifier
+        from sklearn.ensemble import RandomForestClassifier
+        if self.clave_modelo == 'knn' and self.indice_knn is not None:
+            dim = self.train_set[0].shape[1]
+            self.modelo = _indexed_knn_classifier()(indice=self.indice_knn)
+            self.param_distributions = {
+                'n_neighbors': np.arange(1, 31),
+                'weights': ['uniform', 'distance'],
+                'n_components': [c for c in [16, 32, 64, 128] if c < dim] + [None]
+            }
+        elif self.clave_modelo == 'knn':
             self.modelo = KNeighborsClassifier()
             self.param_distributions = {
                 'n_neighbors': np.arange(1, 31),
@@ -522,7 +3197,8 @@ class model_trainer:
         elif self.clave_modelo == 'ann':
             pass
     
-    def train_model(self):
+    def train_model(self, busqueda: str = 'aleatoria', presupuesto: float = None, reanudar: bool = True):
+        # busqueda: 'aleatoria' (RandomizedSearchCV) o 'halving' (successive halving con presupuesto en segundos)
         if not self.__is_trained:
             # Configurar el modelo
             self.__setup_model()
@@ -530,76 +3206,199 @@ class model_trainer:
             X_train = self.train_set[0]
             Y_train = self.label.fit_transform(self.train_set[1])
             
-            # Configurar RandomizedSearchCV
-            random_search = RandomizedSearchCV(
-                estimator=self.modelo,
-                param_distributions=self.param_distributions,
-                n_iter = 100, # Por ajustar
-                cv = 5, # Por ajustar
-                verbose = 2,
-                random_state=42,
-                n_jobs=-1
-            )
+            if busqueda == 'aleatoria':
+                # Configurar RandomizedSearchCV
+                from sklearn.model_selection import RandomizedSearchCV
+                random_search = RandomizedSearchCV(
+                    estimator=self.modelo,
+                    param_distributions=self.param_distributions,
+                    n_iter = 100, # Por ajustar
+                    cv = 5, # Por ajustar
+                    verbose = 2,
+                    random_state=42,
+                    n_jobs=-1
+                )
+            elif busqueda == 'halving':
+                # Log de la búsqueda para poder reanudarla si se interrumpe
+                log_path = os.path.join(venv, f'{self.representacion}-processing', 'models', f'{self.clave_modelo}-search.jsonl')
+                os.makedirs(os.path.dirname(log_path), exist_ok=True)
+                if not reanudar and os.path.exists(log_path):
+                    os.remove(log_path)
+                
+                if 'n_jobs' in self.modelo.get_params():
+                    self.modelo.set_params(n_jobs=-1)
+                random_search = halving_search(
+                    estimator=self.modelo,
+                    param_distributions=self.param_distributions,
+                    n_candidates = 100,
+                    cv = 5,
+                    resource = 'n_estimators' if self.clave_modelo == 'rf' else 'n_samples',
+                    budget = presupuesto,
+                    log_path = log_path,
+                    random_state=42
+                )
+            else:
+                raise ValueError("'busqueda' debe ser 'aleatoria' o 'halving'.")
             
             random_search.fit(X_train,Y_train)
             self.modelo = random_search.best_estimator_
             self.__is_trained = True
+            self.__filas_incrementales = 0
         else:
             print('Ya está entrenado el modelo.')
-        
-    def generate_error_reports(self):
+
+    def __as_frame(self, X) -> pd.DataFrame:
+        columns = self.train_set[0].columns
+        if isinstance(X, pd.DataFrame):
+            if list(X.columns) != list(columns):
+                raise ValueError('Las columnas de los datos nuevos no coinciden con las del entrenamiento.')
+            return X.astype(np.float32)
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(columns):
+            raise ValueError(f'Se esperaban filas de {len(columns)} características; llegaron de forma {X.shape}.')
+        return pd.DataFrame(X, columns=columns)
+
+    def update_model(self, X_train, y_train, X_test=None, y_test=None, arboles: int = None, muestra_previa: float = 0.25,
+                     limite_refit: float = 0.5, exportar: bool = True, engine: evaluation_engine = None) -> dict:
+        # Actualiza el modelo entrenado con filas nuevas sin repetir la búsqueda de hiperparámetros:
+        #   knn: se agregan las filas al conjunto de entrenamiento y se vuelve a ajustar (solo reconstruye el índice)
+        #   rf:  se agregan `arboles` árboles (por defecto, en proporción a las filas nuevas) entrenados con las filas
+        #        nuevas más una muestra estratificada de `muestra_previa` de las anteriores
+        # Si aparece una letra nueva, o las filas agregadas desde el último ajuste completo superan `limite_refit` del
+        # entrenamiento, se reajusta el modelo entero con los mismos hiperparámetros. Después se vuelve a evaluar
+        # (con las filas de prueba nuevas, si hay) y se exporta.
+        from sklearn.base import clone
+        from sklearn.ensemble import RandomForestClassifier
+        if not self.__is_trained:
+            raise ValueError('Modelo no entrenado.')
+        if self.clave_modelo not in ['knn', 'rf']:
+            raise ValueError('Solo se pueden actualizar modelos knn o rf.')
+        start = time.perf_counter()
+
+        X_new = self.__as_frame(X_train)
+        y_new = pd.Series(np.asarray(y_train).astype(str))
+        if len(X_new) != len(y_new):
+            raise ValueError(f'Hay {len(X_new)} filas y {len(y_new)} etiquetas.')
+        n_previas = len(self.train_set[0])
+
+        self.train_set = [pd.concat([self.train_set[0], X_new], ignore_index=True),
+                          pd.concat([self.train_set[1].astype(str), y_new], ignore_index=True)]
+        if X_test is not None:
+            self.test_set = [pd.concat([self.test_set[0], self.__as_frame(X_test)], ignore_index=True),
+                             pd.concat([self.test_set[1].astype(str), pd.Series(np.asarray(y_test).astype(str))], ignore_index=True)]
+        self.__filas_incrementales = getattr(self, '_model_trainer__filas_incrementales', 0) + len(X_new)
+
+        nuevas = sorted(set(y_new) - set(self.label.classes_))
+        if nuevas:
+            self.label.fit(self.train_set[1])
+        arboles_nuevos = 0
+        if self.clave_modelo == 'knn':
+            modo = 'refit'
+            self.modelo.fit(self.train_set[0], self.label.transform(self.train_set[1]))
+            self.__filas_incrementales = 0
+        elif nuevas or self.__filas_incrementales > limite_refit * n_previas:
+            # Reajuste completo con los hiperparámetros ya elegidos (y la cantidad de árboles de la búsqueda)
+            modo = 'refit'
+            base = getattr(self, '_model_trainer__arboles_base', None) or self.modelo.n_estimators
+            self.modelo = clone(self.modelo).set_params(n_estimators=base)
+            self.modelo.fit(self.train_set[0], self.label.transform(self.train_set[1]))
+            self.__filas_incrementales = 0
+            self.__arboles_base = None
+        else:
+            if not isinstance(self.modelo, RandomForestClassifier):
+                raise ValueError('El modelo rf no es un RandomForestClassifier.')
+            modo = 'incremental'
+            if arboles is None:
+                arboles = max(10, math.ceil(self.modelo.n_estimators * len(X_new) / n_previas))
+            # Muestra de las filas anteriores con al menos una fila por letra: los árboles nuevos deben ver todas
+            # las clases para que classes_ no cambie
+            rng = np.random.RandomState(self.modelo.random_state)
+            letras = self.train_set[1].iloc[:n_previas].to_numpy()
+            muestra = []
+            for letra in self.label.classes_:
+                filas = np.flatnonzero(letras == letra)
+                if len(filas):
+                    muestra.append(rng.choice(filas, max(1, int(round(muestra_previa * len(filas)))), replace=False))
+            filas = np.concatenate(muestra + [np.arange(n_previas, len(self.train_set[0]))])
+
+            self.__arboles_base = getattr(self, '_model_trainer__arboles_base', None) or self.modelo.n_estimators
+            self.modelo.set_params(warm_start=True, n_estimators=self.modelo.n_estimators + arboles)
+            try:
+                self.modelo.fit(self.train_set[0].iloc[filas], self.label.transform(self.train_set[1].iloc[filas]))
+            finally:
+                self.modelo.set_params(warm_start=False)
+            arboles_nuevos = arboles
+        # El bosque compilado anterior ya no corresponde al modelo
+        self.modelo_compilado = self.compile_model() if isinstance(self.modelo, RandomForestClassifier) else None
+
+        self.generate_error_reports(engine)
+        if exportar:
+            self.export_model()
+        return {'modo': modo, 'filas': len(X_new), 'letras_nuevas': nuevas, 'arboles_nuevos': arboles_nuevos,
+                'entrenamiento': len(self.train_set[0]), 'segundos': time.perf_counter() - start}
+
+    def generate_error_reports(self, engine: evaluation_engine = None):
         if not self.__is_trained:
             raise SystemError('No hay modelo entrenado.')
         else:    
-            from sklearn.metrics import confusion_matrix, roc_auc_score, roc_curve, auc, classification_report
-            from sklearn.preprocessing import label_binarize
-            
-            # Seteo de variables
-            y_test = self.test_set[1]
-            y_pred = self.predict(self.test_set[0])
-            y_prob = self.modelo.predict_proba(self.test_set[0])
+            # Una sola pasada de predict_proba sobre el test; el resto de las métricas sale de ahí
+            if engine is None:
+                engine = evaluation_engine()
+            modelo = getattr(self, 'modelo_compilado', None) or self.modelo
+            result = engine.evaluate(modelo, self.test_set[0], self.test_set[1], self.label.classes_,
+                                     name=f'{self.representacion}-{self.clave_modelo}')
             
             # Reportes generales de error
-            self.test_report = classification_report(y_test,y_pred)
-            self.CM = pd.DataFrame(confusion_matrix(y_test,y_pred),
-                                    index=self.test_set[1].unique(),columns=self.test_set[1].unique())
-
-            # ROC AUC de cada clase
-            y_bintest = label_binarize(y_test,
-                                       classes=[letra for letra in np.unique(y_test)])
-            fpr = dict()
-            tpr = dict()
-            roc_auc = dict()
-            
-            for i in range(y_bintest.shape[1]):
-                fpr[i], tpr[i], _ = roc_curve(y_bintest[:,i],y_prob[:,i])
-                roc_auc[i] = auc(fpr[i],tpr[i])
-                
-            # ROC AUC: media ponderada
-            roc_auc_ovr = roc_auc_score(y_bintest, y_prob, multi_class='ovr')
-            
-            # ROC AUC: macro
-            roc_auc_ovo = roc_auc_score(y_bintest,y_prob,multi_class='ovo')
+            self.test_report = result['report']
+            self.CM = result['CM']
             
-            # Consolidación
+            # ROC AUC de cada clase; con etiquetas binarizadas, 'ovr' y 'ovo' son ambos el promedio macro
             self.AUC = {
-                'perclass':roc_auc,
-                'ovr':roc_auc_ovr,
-                'ovo':roc_auc_ovo
+                'perclass': result['AUC']['perclass'],
+                'ovr': result['AUC']['macro'],
+                'ovo': result['AUC']['macro']
             }
+            self.evaluacion = result
             
+    def compile_model(self):
+        # Versión en arreglos del random forest para predecir con baja latencia (mismas salidas)
+        from sklearn.ensemble import RandomForestClassifier
+        if not self.__is_trained:
+            raise ValueError('Modelo no entrenado.')
+        if not isinstance(self.modelo, RandomForestClassifier):
+            raise ValueError('Solo se puede compilar un random forest.')
+        self.modelo_compilado = compiled_forest(self.modelo)
+        return self.modelo_compilado
+
+    def inference_artifact(self):
+        # Lo mínimo para predecir, sin datasets ni reportes
+        if not self.__is_trained:
+            raise ValueError('Modelo no entrenado.')
+        return inference_model(getattr(self, 'modelo_compilado', None) or self.modelo, self.label.classes_,
+                               self.train_set[0].columns, self.representacion, self.clave_modelo,
+                               extractor_params(self.representacion))
+
     def export_model(self):
-        path = os.path.join(venv,f'{self.representacion}-processing/models/{self.clave_modelo}-model.pkl')
-        with open(path, 'wb') as file:
+        from sklearn.ensemble import RandomForestClassifier
+        if self.__is_trained and isinstance(self.modelo, RandomForestClassifier):
+            self.compile_model()
+        folder = os.path.join(venv, f'{self.representacion}-processing', 'models')
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f'{self.clave_modelo}-model.pkl'), 'wb') as file:
             pickle.dump(self,file)
+        # Artefacto separado para el demo: es lo que prefiere load_model
+        if self.__is_trained:
+            self.inference_artifact().save(os.path.join(folder, f'{self.clave_modelo}-inference'))
             
+    @profiled('model_trainer.predict')
     def predict(self, X_test):
         if not self.__is_trained:
             raise ValueError('Modelo no entrenado.')
         else:
             # Como está en Label, la predicción arrojaría un número.
             # Con este nuevo método de reemplazo, te arroja la letra directamente.
-            return self.label.inverse_transform(self.modelo.predict(X_test))
+            modelo = getattr(self, 'modelo_compilado', None) or self.modelo
+            return self.label.inverse_transform(modelo.predict(X_test))
         
 # En general, este archivo py no debería ser iniciado desde la raíz nunca, dado que es contraproducente. No obstante, lo haré acá para crear los multiprocs.
 if __name__ == '__main__':
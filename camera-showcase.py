@@ -1,65 +1,161 @@
 import cv2
+import time
+import threading
 import numpy as np
 import tkinter as tk
 import QoL as qol
 from tkinter import ttk
 from PIL import Image, ImageTk
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.ensemble import RandomForestClassifier
+
+# Configuración del pipeline
+DROP_FRAMES = True  # True: siempre se procesa el cuadro más reciente; False: la cámara espera al extractor
+WORKERS = 1         # Hilos de extracción y predicción
+RENDER_MS = 15      # Cada cuánto revisa la UI si hay resultados nuevos
+MOTION_THRESHOLD = 4.0  # Diferencia media (0-255) bajo la cual se reutiliza la última predicción
+SMOOTHING_WINDOW = 7    # Predicciones recientes que votan la letra mostrada
+MAX_MODELS = 4          # Modelos residentes; se descartan los usados hace más tiempo
+TRACKING = True         # Seguir la mano entre cuadros en lugar de buscarla en todo el cuadro cada vez
 
 cap = cv2.VideoCapture(0)
-keywords = [{'tecnica': tec, 'modelo':mod} for tec in ['graph','gradient'] for mod in ['knn','rf']]
-
-# Cargar modelos entrenados
-models = {
-    'mediapipe': {
-        'knn': qol.load_model(keywords[0]),
-        'rf': qol.load_model(keywords[1]),
-    },
-    'hog': {
-        'knn': qol.load_model(keywords[2]),
-        'rf': qol.load_model(keywords[3]),
-    }
-}
-current_models = models['mediapipe']
+TECHNIQUES = {'mediapipe': 'graph', 'hog': 'gradient'}
+
+# Los modelos se cargan en segundo plano la primera vez que se elige una técnica
+registry = qol.model_registry(capacity=MAX_MODELS)
+
+# Con seguimiento, GrabCut parte del rectángulo y los GMM del cuadro anterior y se detiene al converger;
+# MediaPipe corre en modo video (una sesión por hilo). Los vectores son los mismos que usan los modelos.
+if TRACKING:
+    qol.hog_transform.configure(qol.segmentation_engine('grabcut', iterations=20, tol=0.002, reuse=True))
+
+# Estado compartido con los hilos (los hilos no deben tocar variables de Tk)
+state = {'current': 'mediapipe', 'status': ''}
+registry.request(TECHNIQUES[state['current']])
+
+frames = qol.latest_frame(drop=DROP_FRAMES)
+results = qol.latest_frame(drop=True)
+stop = threading.Event()
+
+gate = qol.motion_gate(threshold=MOTION_THRESHOLD)
+smoothers = {'knn': qol.prediction_smoother(SMOOTHING_WINDOW), 'rf': qol.prediction_smoother(SMOOTHING_WINDOW)}
 
 def update_models(selected_technique):
-    global current_models
-    current_models = models[selected_technique]
-
-# Función para procesar el frame de la cámara
-def process_frame():
-    ret, frame = cap.read()
-    if not ret:
-        return
-
-    # Extrae características según la técnica seleccionada
-    if technique_var=='mediapipe':
-        ins = qol.mediapipe_landmarks(frame)
-        features = ins.extract_values(normalize=True)
-    elif technique_var=='hog':
-        ins = qol.hog_transform(frame)
-        features = ins.extract_values(normalize=True)
-    
-    # Predicciones con los modelos
-    knn_prediction = current_models['knn'].predict([features])[0]
-    rf_prediction = current_models['rf'].predict([features])[0]
-    knn_label.config(text=knn_prediction)
-    rf_label.config(text=rf_prediction)
-
-    # Mostrar el frame con el filtro de la técnica en la UI
-    img = Image.fromarray(ins.image)
-    imgtk = ImageTk.PhotoImage(image=img)
-    camera_label.imgtk = imgtk
-    camera_label.configure(image=imgtk)
-
-    # Llamar a esta función nuevamente después de 10 ms
-    camera_label.after(10, process_frame)
-
-# ----------------------- 
+    # Los modelos se piden al registro en el próximo cuadro
+    state['current'] = selected_technique
+    # Al cambiar de técnica se vuelve a extraer y se olvidan las votaciones anteriores
+    gate.reset()
+    qol.hog_transform.segmenter.reset()
+    for smoother in smoothers.values():
+        smoother.reset()
+
+# Hilo de captura: lee la cámara y deja solo el último cuadro
+def capture_loop():
+    while not stop.is_set():
+        ret, frame = cap.read()
+        if not ret:
+            time.sleep(0.01)
+            continue
+        frames.put((frame, time.perf_counter()))
+
+# Hilos de trabajo: extraen características y predicen
+def worker_loop():
+    while not stop.is_set():
+        item = frames.get(timeout=0.1)
+        if item is None:
+            continue
+        frame, captured = item
+        technique = state['current']
+
+        # Mientras se cargan los modelos de la técnica no se procesa nada
+        try:
+            current_models = registry.request(TECHNIQUES[technique])
+        except Exception as error:
+            # Cualquier error del cargador (archivo ausente, pickle incompatible, módulo faltante...) se muestra
+            # en la UI; si el hilo muriera, la UI se quedaría en "Cargando" para siempre
+            state['status'] = f'Error al cargar modelos de {technique}: {error!r}'
+            time.sleep(1)
+            continue
+        if current_models is None:
+            state['status'] = f'Cargando modelos de {technique}...'
+            continue
+        state['status'] = ''
+
+        # Si la escena no cambió, la predicción anterior sigue siendo válida
+        if not gate.changed(frame):
+            continue
+
+        # Extrae características según la técnica seleccionada
+        try:
+            if technique=='mediapipe':
+                session = qol.mediapipe_landmarks.video_session() if TRACKING else None
+                ins = qol.mediapipe_landmarks(frame, session=session)
+            elif technique=='hog':
+                ins = qol.hog_transform(frame)
+            features = ins.extract_values(normalize=True)
+        except ValueError:
+            # p. ej. no se encontró ningún contorno para segmentar: se salta el cuadro
+            continue
+        except Exception as error:
+            # p. ej. un cv2.error de GrabCut: se informa y se sigue con el próximo cuadro
+            state['status'] = f'Error al extraer características ({technique}): {error!r}'
+            continue
+
+        # Predicciones con los modelos
+        try:
+            knn_prediction = current_models['knn'].predict([features])[0]
+            rf_prediction = current_models['rf'].predict([features])[0]
+        except Exception as error:
+            state['status'] = f'Error al predecir ({technique}): {error!r}'
+            time.sleep(1)
+            continue
+        results.put((ins.image, knn_prediction, rf_prediction, captured, technique))
+
+def to_display(image):
+    # La imagen de HOG es float; se lleva a uint8 para mostrarla
+    if image.dtype != np.uint8:
+        image = cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    return image
+
+meter = qol.rate_meter()
+last_captured = 0.0
+
+# La UI solo dibuja lo que ya calcularon los hilos
+def render():
+    global last_captured
+    item = results.get(timeout=0)
+    if item is not None:
+        image, knn_prediction, rf_prediction, captured, technique = item
+        # Con varios hilos los resultados pueden llegar desordenados: no se retrocede en el tiempo.
+        # Tampoco se mezclan votos de una técnica que ya no está seleccionada.
+        if captured > last_captured and technique == state['current']:
+            last_captured = captured
+            meter.tick(latency=time.perf_counter() - captured)
+            knn_label.config(text=smoothers['knn'].update(knn_prediction))
+            rf_label.config(text=smoothers['rf'].update(rf_prediction))
+
+            # Mostrar el frame con el filtro de la técnica en la UI
+            img = Image.fromarray(to_display(image))
+            imgtk = ImageTk.PhotoImage(image=img)
+            camera_label.imgtk = imgtk
+            camera_label.configure(image=imgtk)
+            stats_label.config(text=f'{meter.fps:.1f} FPS | {meter.latency * 1000:.0f} ms | {frames.dropped} descartados | {gate.skipped} sin cambios')
+    if state['status']:
+        stats_label.config(text=state['status'])
+
+    if not stop.is_set():
+        camera_label.after(RENDER_MS, render)
+
+def on_close():
+    stop.set()
+    registry.close()
+    frames.close()
+    results.close()
+    root.destroy()
+
+# -----------------------
 # UI
 root = tk.Tk()
 root.title("Alfabeto de señas")
+root.protocol("WM_DELETE_WINDOW", on_close)
 
 # Label para cámara
 camera_label = tk.Label(root)
@@ -81,10 +177,21 @@ knn_label.grid(row=1, column=2, sticky='W')
 rf_label = tk.Label(root, text="", font=("Helvetica", 24))
 rf_label.grid(row=2, column=2, sticky='W')
 
-# Empezar a procesar frames de la cámara
-process_frame()
+# Label para FPS y latencia de punta a punta
+stats_label = tk.Label(root, text="", font=("Helvetica", 10))
+stats_label.grid(row=3, column=1, columnspan=2, sticky='W')
+
+# Empezar a capturar y procesar frames de la cámara
+threads = [threading.Thread(target=capture_loop, daemon=True)]
+threads += [threading.Thread(target=worker_loop, daemon=True) for _ in range(WORKERS)]
+for thread in threads:
+    thread.start()
+render()
 root.mainloop()
 
 # Liberar la cámara y cerrar todas las ventanas
+stop.set()
+for thread in threads:
+    thread.join(timeout=1)
 cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+cv2.destroyAllWindows()
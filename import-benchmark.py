@@ -0,0 +1,104 @@
+# Mide cuánto cuesta importar QoL: arranque en frío de un intérprete nuevo y arranque de un proceso 'spawn'
+# (lo que paga cada worker de multiproc-<técnica>.py). Con --ref compara contra otra versión de QoL.py del repo.
+#   python import-benchmark.py                 -> versión actual
+#   python import-benchmark.py --ref HEAD~1    -> antes (QoL.py de esa revisión) / después (versión actual)
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY = ['torch', 'cv2', 'pandas', 'sklearn', 'mediapipe', 'skimage', 'scipy']
+
+COLD = '''
+import sys, time, json
+start = time.perf_counter()
+import QoL
+qol = time.perf_counter() - start
+start = time.perf_counter()
+config = QoL.device_configuration()
+device = time.perf_counter() - start
+print(json.dumps({{'qol': qol, 'device': device, 'heavy': [m for m in {heavy} if m in sys.modules]}}))
+'''
+
+def cold_start(folder: str, repeat: int) -> dict:
+    # Intérprete nuevo por repetición: 'total' incluye el arranque de Python
+    import json
+    results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        path = os.pathsep.join(filter(None, [folder, os.environ.get('PYTHONPATH')]))
+        process = subprocess.run([sys.executable, '-c', COLD.format(heavy=HEAVY)], cwd=folder, env={**os.environ, 'PYTHONPATH': path},
+                                 capture_output=True, text=True)
+        total = time.perf_counter() - start
+        if process.returncode != 0:
+            raise RuntimeError(f'No se pudo importar QoL desde {folder}:\n{process.stderr}')
+        results.append({**json.loads(process.stdout.strip().splitlines()[-1]), 'total': total})
+    return {
+        'import_ms': statistics.median(r['qol'] for r in results) * 1000,
+        'device_ms': statistics.median(r['device'] for r in results) * 1000,
+        'total_ms': statistics.median(r['total'] for r in results) * 1000,
+        'heavy': results[-1]['heavy']
+    }
+
+def worker(folder: str, connection):
+    # Lo mismo que hace cada worker del template al arrancar: importar QoL y configurar el dispositivo
+    sys.path.insert(0, folder)
+    import QoL
+    QoL.device_configuration()
+    connection.send(time.perf_counter())
+    connection.close()
+
+def spawn_start(folder: str, repeat: int) -> dict:
+    # Desde Process.start() hasta que el worker terminó de importar (perf_counter es monotónico del sistema)
+    context = mp.get_context('spawn')
+    times = []
+    for _ in range(repeat):
+        parent, child = context.Pipe(duplex=False)
+        process = context.Process(target=worker, args=(folder, child))
+        start = time.perf_counter()
+        process.start()
+        ready = parent.recv()
+        times.append(ready - start)
+        process.join()
+    return {'spawn_ms': statistics.median(times) * 1000}
+
+def benchmark(folder: str, repeat: int) -> dict:
+    return {**cold_start(folder, repeat), **spawn_start(folder, repeat)}
+
+def checkout(ref: str) -> str:
+    # QoL.py de la revisión pedida en una carpeta temporal
+    root = os.path.dirname(os.path.abspath(__file__))
+    source = subprocess.run(['git', 'show', f'{ref}:QoL.py'], cwd=root, capture_output=True, text=True, check=True).stdout
+    folder = tempfile.mkdtemp(prefix='qol-')
+    with open(os.path.join(folder, 'QoL.py'), 'w', encoding='utf-8') as file:
+        file.write(source)
+    return folder
+
+def show(name: str, result: dict):
+    print(f"{name:<10} import {result['import_ms']:8.1f} ms | device_configuration {result['device_ms']:7.1f} ms | "
+          f"intérprete {result['total_ms']:8.1f} ms | spawn {result['spawn_ms']:8.1f} ms")
+    print(f"{'':<10} módulos pesados cargados: {', '.join(result['heavy']) or 'ninguno'}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tiempo de importación de QoL y de arranque de workers.')
+    parser.add_argument('--ref', help='revisión de git para comparar (p. ej. HEAD~1)')
+    parser.add_argument('--repeat', type=int, default=5, help='repeticiones; se reporta la mediana')
+    args = parser.parse_args()
+
+    current = os.path.dirname(os.path.abspath(__file__))
+    if args.ref:
+        folder = checkout(args.ref)
+        try:
+            before = benchmark(folder, args.repeat)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        show('antes', before)
+    after = benchmark(current, args.repeat)
+    show('después' if args.ref else 'actual', after)
+    if args.ref:
+        print(f"import x{before['import_ms'] / after['import_ms']:.1f} más rápido | spawn x{before['spawn_ms'] / after['spawn_ms']:.1f} más rápido")
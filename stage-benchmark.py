@@ -0,0 +1,209 @@
+# Mide cada etapa de la extracción y de la inferencia por separado (lectura, resize, segmentación, HOG,
+# MediaPipe, extractores completos y predicción de los modelos) a varias resoluciones y tamaños de lote.
+# Reporta percentiles de latencia y throughput, y guarda los resultados en JSON para comparar versiones.
+#   python stage-benchmark.py --output antes.json
+#   python stage-benchmark.py --output despues.json --compare antes.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import cv2
+import QoL as qol
+
+def synthetic_hand(size: int, seed: int = 0) -> np.ndarray:
+    # Fondo con ruido y una "mano" color piel (palma y dedos) centrada: suficiente para GrabCut y los contornos
+    rng = np.random.RandomState(seed)
+    image = rng.randint(20, 70, (size, size, 3)).astype(np.uint8)
+    center = (size // 2, int(size * 0.6))
+    skin = (140, 170, 215)
+    cv2.ellipse(image, center, (size // 6, size // 5), 0, 0, 360, skin, -1)
+    for i in range(5):
+        x = center[0] - size // 7 + i * size // 14
+        cv2.rectangle(image, (x, int(size * 0.2)), (x + size // 24, center[1]), skin, -1)
+    return cv2.GaussianBlur(image, (5, 5), 0)
+
+def fixture_images(folder: str, resolution: int, count: int) -> list:
+    # Imágenes reales (p. ej. una carpeta de synthetic-asl-alphabet) llevadas a la resolución pedida
+    names = sorted(name for name in os.listdir(folder) if name.lower().endswith(('.png', '.jpg', '.jpeg')))[:count]
+    if not names:
+        raise ValueError(f'No hay imágenes en {folder}.')
+    return [cv2.resize(cv2.imread(os.path.join(folder, name)), (resolution, resolution)) for name in names]
+
+def measure(func, inputs: list, repeat: int, warmup: int = 2) -> np.ndarray:
+    # Latencia de cada llamada en segundos; las entradas se recorren en ronda
+    for i in range(warmup):
+        func(inputs[i % len(inputs)])
+    times = np.empty(repeat)
+    for i in range(repeat):
+        item = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        func(item)
+        times[i] = time.perf_counter() - start
+    return times
+
+def summarize(stage: str, times: np.ndarray, resolution: int = None, batch: int = 1, **extra) -> dict:
+    ms = times * 1000
+    return {'stage': stage, 'resolution': resolution, 'batch': batch, **extra, 'n': len(times),
+            'mean_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)), 'p90_ms': float(np.percentile(ms, 90)),
+            'p99_ms': float(np.percentile(ms, 99)), 'throughput': float(batch / times.mean())}
+
+def image_stages(images: list, paths: list, resolution: int, repeat: int) -> list:
+    results = []
+    results.append(summarize('cv2.imread', measure(cv2.imread, paths, repeat), resolution))
+    results.append(summarize('image_preprocessing', measure(qol.image_preprocessing, paths, repeat), resolution))
+    instances = [qol.image_preprocessing(image) for image in images]
+    results.append(summarize('resize_image', measure(lambda ins: ins.resize_image(qol.hog_transform.params['resize']), instances, repeat), resolution))
+    results.append(summarize('segment_image', measure(lambda ins: ins.segment_image(), instances, repeat), resolution))
+
+    # HOG siempre trabaja sobre la imagen ya reducida y en grises
+    from skimage.feature import hog
+    params = qol.hog_transform.params
+    small = [cv2.cvtColor(cv2.resize(image, (params['resize'], params['resize'])), cv2.COLOR_BGR2GRAY) for image in images]
+    hog_call = lambda gray: hog(gray, orientations=params['orientations'], pixels_per_cell=params['pixels_per_cell'],
+                                cells_per_block=params['cells_per_block'], block_norm=params['block_norm'], visualize=True)
+    results.append(summarize(f"skimage.hog {params['resize']}px", measure(hog_call, small, repeat), resolution))
+    engine = qol.hog_transform.engine
+    results.append(summarize(f"hog_engine {params['resize']}px", measure(engine.features, small, repeat), resolution))
+    batch = np.stack(small)
+    results.append(summarize(f"hog_engine lote {params['resize']}px", measure(engine.features, [batch], repeat), resolution, len(small)))
+    results.append(summarize('hog_transform', measure(lambda path: qol.hog_transform(path).extract_values(), paths, repeat), resolution))
+
+    try:
+        session = qol.get_hands_session()
+    except ImportError as error:
+        print(f'MediaPipe no disponible, se omite: {error}')
+    else:
+        results.append(summarize('Hands.process', measure(session.process, images, repeat), resolution))
+        results.append(summarize('mediapipe_landmarks', measure(lambda path: qol.mediapipe_landmarks(path).extract_values(), paths, repeat), resolution))
+    return results
+
+def tracking_check(images: list, resolution: int, repeat: int, min_iou: float = 0.9) -> dict:
+    # Secuencia estática con la mano grande (toca casi todo el cuadro de 64x64): con seguimiento, la máscara de
+    # cada cuadro debe coincidir con la de una detección completa, sin cuadros enteros marcados como mano
+    pixels = qol.hog_transform.params['resize']
+    reference = qol.segmentation_engine('grabcut', iterations=20)
+    tracked = qol.segmentation_engine('grabcut', iterations=20, tol=0.002, reuse=True)
+    times, ious = [], []
+    for image in images:
+        h, w = image.shape[:2]
+        frame = cv2.resize(image[int(h * 0.3):, int(w * 0.2):int(w * 0.8)], (pixels, pixels))
+        expected = reference.mask(frame)
+        tracked.reset()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            mask = tracked.mask(frame)
+            times.append(time.perf_counter() - start)
+            union = np.count_nonzero(mask | expected)
+            ious.append(np.count_nonzero(mask & expected) / union if union else 1.0)
+    result = summarize('grabcut con seguimiento', np.array(times), resolution, iou_min=float(np.min(ious)))
+    result['ok'] = result['iou_min'] >= min_iou
+    return result
+
+def benchmark_models(batches: list, repeat: int) -> list:
+    # Modelos entrenados si existen; si no, unos del mismo tipo ajustados con datos sintéticos de la misma dimensión
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.ensemble import RandomForestClassifier
+    results = []
+    rng = np.random.RandomState(0)
+    # graph: 21 puntos x (x, y); gradient: HOG de 64x64 con celdas de 8 y bloques de 2 -> 7*7*2*2*9
+    dims = {'graph': 42, 'gradient': 1764}
+    for tecnica, dim in dims.items():
+        for modelo in ['knn', 'rf']:
+            try:
+                model, origen = qol.load_model({'tecnica': tecnica, 'modelo': modelo}), 'entrenado'
+            except (OSError, ValueError):
+                X, y = rng.rand(5000, dim).astype(np.float32), rng.randint(0, 26, 5000)
+                estimator = KNeighborsClassifier() if modelo == 'knn' else qol.compiled_forest(RandomForestClassifier(100, random_state=42).fit(X, y))
+                if modelo == 'knn':
+                    estimator.fit(X, y)
+                model, origen = estimator, 'sintético'
+            for batch in batches:
+                inputs = [rng.rand(batch, dim).astype(np.float32) for _ in range(4)]
+                results.append(summarize('predict', measure(model.predict, inputs, repeat), None, batch,
+                                         tecnica=tecnica, modelo=modelo, origen=origen))
+    return results
+
+def metadata() -> dict:
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = None
+    import sklearn
+    return {'fecha': datetime.datetime.now().isoformat(timespec='seconds'), 'git': revision or None,
+            'python': platform.python_version(), 'numpy': np.__version__, 'cv2': cv2.__version__,
+            'sklearn': sklearn.__version__, 'plataforma': platform.platform(), 'cpus': os.cpu_count()}
+
+def result_key(result: dict) -> tuple:
+    return (result['stage'], result['resolution'], result['batch'], result.get('tecnica'), result.get('modelo'))
+
+def show(results: list, baseline: list = None, tolerance: float = 0.1) -> int:
+    # Tabla de resultados; con baseline agrega la razón p50 actual / anterior y marca las regresiones
+    previous = {result_key(result): result for result in baseline or []}
+    regressions = 0
+    print(f"{'etapa':<32}{'res':>6}{'lote':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'por s':>10}" + ('   vs antes' if baseline else ''))
+    for result in results:
+        name = result['stage'] + (f" {result['tecnica']}/{result['modelo']}" if 'modelo' in result else '')
+        line = (f"{name:<32}{result['resolution'] or '-':>6}{result['batch']:>6}{result['p50_ms']:>10.2f}"
+                f"{result['p90_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['throughput']:>10.1f}")
+        before = previous.get(result_key(result))
+        if before is not None:
+            ratio = result['p50_ms'] / before['p50_ms']
+            flag = ' REGRESIÓN' if ratio > 1 + tolerance else (' mejora' if ratio < 1 - tolerance else '')
+            regressions += flag == ' REGRESIÓN'
+            line += f'   x{ratio:.2f}{flag}'
+        print(line)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Latencia por etapa de la extracción y la inferencia.')
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[128, 256, 512])
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 32, 256])
+    parser.add_argument('--repeat', type=int, default=20, help='llamadas medidas por etapa')
+    parser.add_argument('--images', default=None, help='carpeta con imágenes reales; por defecto se usan imágenes sintéticas')
+    parser.add_argument('--stages', choices=['all', 'images', 'models'], default='all')
+    parser.add_argument('--output', default=None, help='archivo JSON donde guardar los resultados')
+    parser.add_argument('--compare', default=None, help='JSON de una corrida anterior para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='aumento relativo de p50 que cuenta como regresión')
+    args = parser.parse_args()
+
+    results = []
+    if args.stages in ['all', 'images']:
+        with tempfile.TemporaryDirectory() as folder:
+            for resolution in args.resolutions:
+                if args.images:
+                    images = fixture_images(args.images, resolution, 8)
+                else:
+                    images = [synthetic_hand(resolution, seed) for seed in range(8)]
+                paths = []
+                for i, image in enumerate(images):
+                    paths.append(os.path.join(folder, f'{resolution}-{i}.png'))
+                    cv2.imwrite(paths[-1], image)
+                results += image_stages(images, paths, resolution, args.repeat)
+                results.append(tracking_check(images, resolution, args.repeat))
+    if args.stages in ['all', 'models']:
+        results += benchmark_models(args.batches, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+    regressions = show(results, baseline, args.tolerance)
+    failed = [result for result in results if result.get('ok') is False]
+    for result in failed:
+        print(f"{result['stage']} ({result['resolution']}px): IoU mínima {result['iou_min']:.3f} contra la detección completa.")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'version': 1, 'meta': metadata(), 'results': results}, file, ensure_ascii=False, indent=2)
+    if regressions:
+        print(f'{regressions} etapas más lentas que la corrida anterior (tolerancia {args.tolerance:.0%}).')
+    if regressions or failed:
+        sys.exit(1)